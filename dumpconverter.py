@@ -0,0 +1,76 @@
+import os, sys, getopt, json
+import numpy as np
+from model.dumpreader import StreamingDumpReader, ColumnarDumpReader
+
+def convert_raw_data(raw_data : dict, metrics : list, values_file, position : int):
+    offsets = dict()
+    for metric, samples in raw_data.items():
+        if metric == "vm":
+            continue # vm list of node is stored in meta.json
+        if metric not in metrics:
+            metrics.append(metric)
+        column = np.array([np.nan if x is None else x for x in samples], dtype=np.float64)
+        column.tofile(values_file)
+        offsets[metrics.index(metric)] = (position, position + column.size)
+        position += column.size
+    return offsets, position
+
+def convert_dump(input_file : str, output_directory : str):
+    reader = StreamingDumpReader(input_file)
+    os.makedirs(output_directory)
+    vm_list = list(reader.vm_spans.keys())
+    metrics, node_vm, entity_offsets = list(), list(), list()
+    position = 0
+    with open(os.path.join(output_directory, "values.bin"), 'wb') as values_file:
+        for occurence_data in reader: # one occurence at a time
+            node_vm.append(occurence_data["node"].get("vm", list()))
+            occurence_offsets = list()
+            offsets, position = convert_raw_data(occurence_data["node"], metrics, values_file, position)
+            occurence_offsets.append(offsets)
+            for domain_name in vm_list:
+                offsets, position = convert_raw_data(occurence_data["vm"][domain_name], metrics, values_file, position)
+                occurence_offsets.append(offsets)
+            entity_offsets.append(occurence_offsets)
+    # Offset index: (entity, occurence, metric, [start, end[)
+    offsets_array = np.full((len(vm_list)+1, len(entity_offsets), len(metrics), 2), -1, dtype=np.int64)
+    for occurence, occurence_offsets in enumerate(entity_offsets):
+        for entity, offsets in enumerate(occurence_offsets):
+            for metric_index, span in offsets.items():
+                offsets_array[entity, occurence, metric_index] = span
+    np.save(os.path.join(output_directory, "offsets.npy"), offsets_array)
+    meta = {"dtype": "float64", "config": reader.get_config(), "epoch": [reader.get_epoch(occurence) for occurence in range(reader.get_occurence_count())],
+            "vm": vm_list, "metrics": metrics, "node_vm": node_vm}
+    with open(os.path.join(output_directory, "meta.json"), 'w') as f:
+        f.write(json.dumps(meta))
+    return ColumnarDumpReader(output_directory)
+
+if __name__ == '__main__':
+
+    short_options = "hi:o:"
+    long_options = ["help","input=","output="]
+    input_file = None
+    output_directory = None
+
+    try:
+        arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
+    except getopt.error as err:
+        print (str(err)) # Output error, and return with an error code
+        sys.exit(2)
+    for current_argument, current_value in arguments:
+        if current_argument in ("-i", "--input"):
+            input_file = current_value
+        elif current_argument in ("-o", "--output"):
+            output_directory = current_value
+        else:
+            print("python3 dumpconverter.py [--help] --input={dump.json} --output={directory}")
+            sys.exit(0)
+
+    if (input_file is None) or (output_directory is None):
+        print("python3 dumpconverter.py [--help] --input={dump.json} --output={directory}")
+        sys.exit(2)
+    if os.path.exists(output_directory):
+        print("Error: output directory already exists, a non-existing directory is required :", output_directory)
+        sys.exit(2)
+
+    reader = convert_dump(input_file, output_directory)
+    print("Converted", reader.get_occurence_count(), "occurences of", input_file, "to", output_directory)
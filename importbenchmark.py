@@ -0,0 +1,93 @@
+import os, sys, getopt, time, subprocess, tempfile
+
+# Libraries taking hundreds of milliseconds to import, expected to be loaded only on the code path using them
+HEAVY_MODULES = ["tensorflow", "keras", "sklearn", "scipy", "pandas", "matplotlib", "influxdb_client", "gmr", "libvirt"]
+REPOSITORY = os.path.dirname(os.path.abspath(__file__))
+
+def get_import_times(module : str):
+    # Fresh interpreter per entry point, python -X importtime reporting self and cumulative microseconds on stderr
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], cwd=REPOSITORY, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise ValueError("Import of " + module + " failed: " + process.stderr.strip().splitlines()[-1])
+    import_times = list()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("imported package"):
+            continue
+        self_time, cumulative_time, name = line[len("import time:"):].split('|')
+        import_times.append((name[1:].rstrip(), int(self_time), int(cumulative_time))) # nested imports are indented by two spaces per level
+    return import_times
+
+def get_cold_start(dump_location : str, strategy : str, repeat : int):
+    # Wall time of a whole offline replay, in a temporary directory as dumps are written in the current one
+    durations = list()
+    with tempfile.TemporaryDirectory() as directory:
+        for iteration in range(repeat):
+            begin = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(REPOSITORY, "scroogevm.py"), "--strategy=" + strategy, "--load=" + os.path.abspath(dump_location)],
+                           cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            durations.append(time.perf_counter() - begin)
+    return min(durations)
+
+if __name__ == '__main__':
+
+    short_options = "hm:t:l:s:r:o:"
+    long_options = ["help","module=","top=","load=","strategy=","repeat=","output="]
+    modules = ["scroogevm", "scroogevmsweep", "sketchaccuracy", "stabilitybenchmark", "dumpconverter"]
+    top = 5
+    dump_location = None
+    strategy = "borg"
+    repeat = 3
+    output = None
+
+    try:
+        arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
+    except getopt.error as err:
+        print (str(err)) # Output error, and return with an error code
+        sys.exit(2)
+    for current_argument, current_value in arguments:
+        if current_argument in ("-m", "--module"):
+            modules = current_value.split(',')
+        elif current_argument in ("-t", "--top"):
+            top = int(current_value)
+        elif current_argument in ("-l", "--load"):
+            dump_location = current_value
+        elif current_argument in ("-s", "--strategy"):
+            strategy = current_value
+        elif current_argument in ("-r", "--repeat"):
+            repeat = int(current_value)
+        elif current_argument in ("-o", "--output"):
+            output = current_value
+        else:
+            print("python3 importbenchmark.py [--help] [--module={module}[,{module}...]] [--top={modules}] [--load={dump} [--strategy={strat}] [--repeat={runs}]] [--output={table.csv}]")
+            sys.exit(0)
+
+    # Import time of each entry point, slowest imports and heavy libraries loaded at import
+    rows = list()
+    heavy_loaded = False
+    for module in modules:
+        try:
+            import_times = get_import_times(module)
+        except ValueError as err:
+            print(str(err))
+            sys.exit(2)
+        total = sum([cumulative_time for name, self_time, cumulative_time in import_times if name == name.lstrip()])
+        heavy = sorted(set([name.lstrip().split('.')[0] for name, self_time, cumulative_time in import_times]).intersection(HEAVY_MODULES))
+        heavy_loaded = heavy_loaded or bool(heavy)
+        print("Module", module, ":", len(import_times), "imports in", round(total/1e6, 3), "s, heavy libraries", heavy if heavy else "none")
+        nested = [import_time for import_time in import_times if import_time[0] != module]
+        for name, self_time, cumulative_time in sorted(nested, key=lambda x: x[2], reverse=True)[:top]:
+            print("  |_", name.lstrip(), round(cumulative_time/1e6, 3), "s")
+        rows.extend([(module, name.lstrip(), self_time, cumulative_time) for name, self_time, cumulative_time in import_times])
+
+    if dump_location is not None:
+        print("Cold start of", strategy, "replay :", round(get_cold_start(dump_location, strategy, repeat), 3), "s (best of", repeat, "runs)")
+
+    if output is not None:
+        separator = '\t'
+        with open(output, 'w') as fd:
+            fd.write(separator.join(["entry_point", "module", "self_us", "cumulative_us"]) + '\n')
+            for row in rows:
+                fd.write(separator.join([str(value) for value in row]) + '\n')
+
+    if heavy_loaded: # entry points must not pay heavy imports before their code path needs them
+        sys.exit(1)
@@ -17,11 +17,11 @@ fi
 mkdir "$output_folder"
 source venv/bin/activate
 declare -a strategies=("doa" "nsigma" "rclike" "borg" "scroogevm")
+echo "Running ScroogeVM on ${strategies[*]} strategies"
+python3 scroogevm.py --strategy="$(IFS=,; echo "${strategies[*]}")" --load="$input" --debug=1
 for strategy in "${strategies[@]}"
 do
-    echo "Running ScroogeVM on $strategy strategy"
-    python3 scroogevm.py --strategy="$strategy" --load="$input" --debug=1
-    mv -v dump-*.json "$output_folder/dump-$strategy.json"
-    mv dump-lstm.csv "$output_folder/dump-lstm.csv"
+    mv -v "dump-$strategy.json" "$output_folder/dump-$strategy.json"
 done
+mv dump-lstm.csv "$output_folder/dump-lstm.csv"
 ls "$output_folder"
\ No newline at end of file
@@ -0,0 +1,262 @@
+import json, mmap, os, re
+import numpy as np
+
+class DumpReader(object):
+
+    # Occurence oriented access to an offline trace already loaded as a dict
+    def __init__(self, dump : dict):
+        self.dump = dump
+
+    def get_config(self):
+        return self.dump["config"]
+
+    def get_occurence_count(self):
+        return len(self.dump["epoch"])
+
+    def get_epoch(self, occurence : int):
+        return self.dump["epoch"][occurence]
+
+    def get_vm_raw_data(self, vm_dump_data : dict, occurence : int):
+        raw_data_list = vm_dump_data.get("raw_data", list())
+        if occurence < len(raw_data_list):
+            return raw_data_list[occurence]
+        return dict() # VM not started yet or no data
+
+    def get_occurence(self, occurence : int):
+        vm_data = dict()
+        for domain_name, vm_dump_data in self.dump.get("vm", dict()).items():
+            vm_data[domain_name] = self.get_vm_raw_data(vm_dump_data, occurence)
+        return {"occurence": occurence, "epoch": self.get_epoch(occurence), "node": self.dump["node"]["raw_data"][occurence], "vm": vm_data}
+
+    def __iter__(self):
+        for occurence in range(self.get_occurence_count()):
+            yield self.get_occurence(occurence)
+
+class StreamingDumpReader(DumpReader):
+
+    # Keys (with trailing colon), strings and brackets: numbers are skipped by the regex engine
+    TOKEN_REGEX = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:|"(?:[^"\\]|\\.)*"|[\[\]{}]')
+
+    # Trace is indexed once, each occurence is then decoded on demand. Only epoch and config are kept in memory
+    def __init__(self, file : str):
+        self.file = file
+        self.mmap = None
+        self.mmap_pid = None
+        self.last_occurence = None
+        self.build_index()
+
+    def get_mmap(self):
+        if (self.mmap is None) or (self.mmap_pid != os.getpid()):
+            with open(self.file, 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mmap_pid = os.getpid()
+        return self.mmap
+
+    def __getstate__(self): # mmap cannot be pickled, it is reopened on demand
+        state = self.__dict__.copy()
+        state["mmap"] = None
+        state["mmap_pid"] = None
+        return state
+
+    def decode(self, span : tuple):
+        return json.loads(self.get_mmap()[span[0]:span[1]])
+
+    def build_index(self):
+        self.node_spans = list()
+        self.vm_spans = dict()
+        epoch_span, config_span = None, None
+        path_stack, start_stack, key_stack, is_array_stack = list(), list(), list(), list()
+        for match in StreamingDumpReader.TOKEN_REGEX.finditer(self.get_mmap()):
+            token = match.group(0)[0]
+            if token == 0x22: # '"'
+                if match.group(1) is not None:
+                    key_stack[-1] = json.loads(b'"' + match.group(1) + b'"')
+            elif (token == 0x5b) or (token == 0x7b): # '[' or '{'
+                if path_stack:
+                    path = path_stack[-1] + (key_stack[-1],)
+                    if is_array_stack[-1]: key_stack[-1]+=1 # only containers are counted, raw_data arrays only contain objects
+                else:
+                    path = tuple()
+                is_array = (token == 0x5b)
+                path_stack.append(path)
+                start_stack.append(match.start())
+                key_stack.append(0 if is_array else None)
+                is_array_stack.append(is_array)
+                if (len(path) == 2) and (path[0] == "vm"):
+                    self.vm_spans[path[1]] = list()
+            else: # ']' or '}'
+                path = path_stack.pop()
+                span = (start_stack.pop(), match.end())
+                key_stack.pop()
+                is_array_stack.pop()
+                if (len(path) == 3) and (path[0] == "node") and (path[1] == "raw_data"):
+                    self.node_spans.append(span)
+                elif (len(path) == 4) and (path[0] == "vm") and (path[2] == "raw_data"):
+                    self.vm_spans[path[1]].append(span)
+                elif path == ("epoch",):
+                    epoch_span = span
+                elif path == ("config",):
+                    config_span = span
+        if (epoch_span is None) or (config_span is None):
+            raise ValueError("Dump " + self.file + " is missing epoch or config")
+        self.epoch = self.decode(epoch_span)
+        self.config = self.decode(config_span)
+
+    def get_config(self):
+        return self.config
+
+    def get_occurence_count(self):
+        return len(self.epoch)
+
+    def get_epoch(self, occurence : int):
+        return self.epoch[occurence]
+
+    def get_occurence(self, occurence : int):
+        if (self.last_occurence is not None) and (self.last_occurence["occurence"] == occurence):
+            return self.last_occurence
+        vm_data = dict()
+        for domain_name, spans in self.vm_spans.items():
+            vm_data[domain_name] = self.decode(spans[occurence]) if occurence < len(spans) else dict()
+        self.last_occurence = {"occurence": occurence, "epoch": self.get_epoch(occurence), "node": self.decode(self.node_spans[occurence]), "vm": vm_data}
+        return self.last_occurence
+
+class ColumnarDumpReader(DumpReader):
+
+    # Columnar layout, as written by dumpconverter.py in a directory:
+    # meta.json   : config, epoch, vm names, metric names and node vm lists
+    # values.bin  : every sample as float64, occurence after occurence
+    # offsets.npy : int64 array of shape (entity, occurence, metric, 2), [start, end[ in values.bin or -1 if metric is absent
+    # Entity 0 is the node, entity i is the (i-1)th vm
+    def __init__(self, directory : str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+        self.values = None
+        self.offsets = None
+        self.last_occurence = None
+
+    def get_arrays(self):
+        if self.values is None:
+            # values are shared between processes through the page cache
+            self.values = np.memmap(os.path.join(self.directory, "values.bin"), dtype=self.meta["dtype"], mode='r')
+            self.offsets = np.load(os.path.join(self.directory, "offsets.npy"), mmap_mode='r')
+        return self.values, self.offsets
+
+    def __getstate__(self): # memory maps are reopened on demand
+        state = self.__dict__.copy()
+        state["values"] = None
+        state["offsets"] = None
+        return state
+
+    def get_config(self):
+        return self.meta["config"]
+
+    def get_occurence_count(self):
+        return len(self.meta["epoch"])
+
+    def get_epoch(self, occurence : int):
+        return self.meta["epoch"][occurence]
+
+    def get_raw_data(self, entity : int, occurence : int):
+        values, offsets = self.get_arrays()
+        raw_data = dict()
+        if occurence >= offsets.shape[1]:
+            return raw_data
+        for metric_index, (start, end) in enumerate(offsets[entity, occurence].tolist()):
+            if start < 0:
+                continue
+            column = values[start:end]
+            column_as_list = column.tolist()
+            if column.size and (column != column).any(): # NaN stands for None on conversion
+                column_as_list = [None if x != x else x for x in column_as_list]
+            raw_data[self.meta["metrics"][metric_index]] = column_as_list
+        return raw_data
+
+    def get_occurence(self, occurence : int):
+        if (self.last_occurence is not None) and (self.last_occurence["occurence"] == occurence):
+            return self.last_occurence
+        node_data = self.get_raw_data(0, occurence)
+        if node_data:
+            node_data["vm"] = self.meta["node_vm"][occurence]
+        vm_data = dict()
+        for index, domain_name in enumerate(self.meta["vm"]):
+            vm_data[domain_name] = self.get_raw_data(index+1, occurence)
+        self.last_occurence = {"occurence": occurence, "epoch": self.get_epoch(occurence), "node": node_data, "vm": vm_data}
+        return self.last_occurence
+
+def get_dump_padding(attribute : str):
+    # Same padding as dump_state_to_dict of SliceHost and SliceVm for entities appearing after the first occurence
+    if attribute in ["raw_data", "cpu_percentile", "mem_percentile", "cpi", "hwcpucycles"]:
+        return dict()
+    elif attribute in ["vm_list"]:
+        return list()
+    return 0
+
+def merge_dump_section(dump_section : dict, record_section : dict, iteration : int):
+    for attribute, values in record_section.items():
+        if attribute not in dump_section:
+            dump_section[attribute] = [get_dump_padding(attribute) for x in range(iteration)]
+        dump_section[attribute].extend(values)
+
+def merge_dump_record(dump_dict : dict, record : dict):
+    # A record is the dump of a single occurence, as written by model.dumpwriter.DumpWriter
+    if "config" not in dump_dict:
+        dump_dict["epoch"] = list()
+        for x in ["config", "node", "vm", "model"]:
+            dump_dict[x] = dict()
+    iteration = len(dump_dict["epoch"])
+    dump_dict["config"].update(record["config"])
+    merge_dump_section(dump_dict["node"], record["node"], iteration)
+    for vm, vm_record in record["vm"].items():
+        if vm not in dump_dict["vm"]:
+            dump_dict["vm"][vm] = dict()
+        merge_dump_section(dump_dict["vm"][vm], vm_record, iteration)
+    for x, values in record["model"].items():
+        if x not in dump_dict["model"]:
+            dump_dict["model"][x] = list()
+        dump_dict["model"][x].extend(values)
+    dump_dict["epoch"].extend(record["epoch"])
+    return dump_dict
+
+def load_dump(file : str):
+    # Json Lines dumps are reassembled in the dict shape of json dumps
+    if not file.endswith(".jsonl"):
+        with open(file, 'r') as f:
+            return json.load(f)
+    dump_dict = dict()
+    with open(file, 'r') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break # last record was not fully written
+            merge_dump_record(dump_dict, json.loads(line))
+    return dump_dict
+
+def is_cluster_dump(location : str):
+    # A cluster is either a manifest (one node dump per line) or a directory of node dumps, columnar dumps being directories holding a meta.json
+    if os.path.isdir(location):
+        return not os.path.isfile(os.path.join(location, "meta.json"))
+    return location.endswith(".manifest")
+
+def get_node_dump_locations(location : str):
+    if os.path.isdir(location):
+        node_dumps = list()
+        for entry in sorted(os.listdir(location)):
+            path = os.path.join(location, entry)
+            if entry.endswith(".json") or entry.endswith(".jsonl") or os.path.isfile(os.path.join(path, "meta.json")):
+                node_dumps.append(path)
+        return node_dumps
+    node_dumps = list()
+    with open(location, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if (not line) or line.startswith("#"):
+                continue
+            node_dumps.append(line if os.path.isabs(line) else os.path.join(os.path.dirname(location), line)) # relative to manifest
+    return node_dumps
+
+def open_dump(location : str):
+    if os.path.isdir(location):
+        return ColumnarDumpReader(location)
+    if location.endswith(".jsonl"):
+        return DumpReader(load_dump(location))
+    return StreamingDumpReader(location)
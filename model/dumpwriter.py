@@ -1,15 +1,25 @@
-import subprocess, threading, json
+import threading, json
 
 class DumpWriter(object):
 
-    def __init__(self, file : str, output : dict):
+    # Append-only sink: each slice is written as one JSON line holding only its own occurence
+    # Lines are reassembled in the usual dump dict by model.dumpreader.load_dump
+    def __init__(self, file : str, append : bool = False):
         self.file = file
-        self.output=output
-
-    def run(self):
-        def target():
-            with open(self.file, 'w') as f:
-                f.write(json.dumps(self.output))
-                
-        thread = threading.Thread(target=target)
-        thread.start()
+        self.lock = threading.Lock()
+        self.fd = open(self.file, 'a' if append else 'w')
+
+    def append(self, record : dict):
+        line = json.dumps(record) + '\n'
+        with self.lock: # a single line is written at once, records cannot be interleaved
+            self.fd.write(line)
+            self.fd.flush()
+
+    def tell(self):
+        with self.lock:
+            return self.fd.tell()
+
+    def close(self):
+        with self.lock:
+            if not self.fd.closed:
+                self.fd.close()
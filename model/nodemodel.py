@@ -1,9 +1,9 @@
 from model.slicemodel import SliceModel
 from model.sliceobject import SliceObject
 from model.slicevm import SliceVm
+from model.vmregistry import VmRegistry
+from model.dumpreader import DumpReader
 import time
-import pandas as pd
-import matplotlib.pyplot as plt
 
 class NodeModel(object):
 
@@ -21,11 +21,13 @@ class NodeModel(object):
         self.init_epoch=int(time.time())
         self.slices = list()
         self.aggregation = aggregation
+        self.vm_registry = VmRegistry(number_of_slice=self.number_of_slice, historical_occurences=historical_occurences,
+                                      cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, aggregation=aggregation) # shared by all slice positions
         for i in range(self.number_of_slice):
             self.slices.append(SliceModel(
                 model_node_name= node_name, model_position=i, model_init_epoch=self.init_epoch, model_historical_occurences=historical_occurences, 
                 model_number_of_slice=self.number_of_slice, leftBound=i*slice_scope, rightBound=(i+1)*slice_scope,
-                cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, strategy=strategy, aggregation=aggregation))
+                cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, strategy=strategy, aggregation=aggregation, vm_registry=self.vm_registry))
 
     def build_past_slices_from_epoch(self, past_slice : int):
         for slice in self.slices:
@@ -36,9 +38,9 @@ class NodeModel(object):
         self.get_slice(previous_slice_number).build_slice_from_epoch(previous_scope_number)
         return previous_slice_number
 
-    def build_slice_from_dump(self, dump : dict, occurence : int):
+    def build_slice_from_dump(self, dump : DumpReader, occurence : int):
         scope_number, slice_number = self.get_scope_and_slice_number_from_occurence(occurence)
-        self.get_slice(slice_number).build_slice_from_dump(dump, occurence)
+        self.get_slice(slice_number).build_slice_from_dump(dump.get_occurence(occurence))
         return slice_number
 
     def get_current_scope_and_slice_number(self):
@@ -104,6 +106,8 @@ class NodeModel(object):
         return txt
 
     def display_model(self):
+        import pandas as pd # plotting libraries, only loaded when displayed
+        import matplotlib.pyplot as plt
         slices=[]
         groups=[]
         tiers = {"tier0":[], "tier1":[], "tier2":[]}
@@ -1,10 +1,13 @@
 from model.sliceobjectwrapper import SliceObjectWrapper
-import numpy as np
 import math
 
 # Abstract class
 class NodeBasedOversubscriptionComputation(object):
 
+    # Raw metrics read on the slices window and statistics read on slices, others are neither fetched nor computed
+    required_metrics = list()
+    required_statistics = list()
+
     def set_context(self, object_wrapper : SliceObjectWrapper):
         self.object_wrapper = object_wrapper 
 
@@ -24,6 +27,8 @@ class NodeBasedOversubscriptionComputation(object):
 
 class DoaOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
+    required_statistics = ["cpu_max", "mem_max"]
+
     def __init__(self):
         self.increase_ratio = 20 # increase by 5%
         self.treshold = 0.95
@@ -72,13 +77,14 @@ class DoaOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
 class PercentileOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
+    required_metrics = ["cpu_usage", "mem_usage"]
+
     def __init__(self, cpu_percentile : int, mem_percentile : int):
         self.cpu_percentile = cpu_percentile
         self.mem_percentile = mem_percentile
 
     def __compute_generic_tiers(self, metric : str, percentile : int):
-        values = self.object_wrapper.get_slices_raw_metric(metric)
-        generic_tier0 = np.percentile(values, percentile)
+        generic_tier0 = self.object_wrapper.get_slices_raw_metric_percentile(metric, percentile)
         return generic_tier0, generic_tier0 # No Tier1 in this paper
 
     def compute_cpu_tiers(self):
@@ -91,6 +97,9 @@ class PercentileOversubscriptionComputation(NodeBasedOversubscriptionComputation
 
 class GreedyOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
+    required_metrics = ["cpu_usage", "mem_usage"] # also read by the stability assesser
+    required_statistics = ["cpu_avg", "mem_avg"]
+
     def __init__(self):
         self.bound_min  = 2.0
         self.bound_max  = 5.0
@@ -124,9 +133,7 @@ class GreedyOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
         # Retrieve current context
         current_slice = self.object_wrapper.get_last_slice()
-        cpu_traces = self.object_wrapper.get_slices_raw_metric('cpu_usage')
-        current_avg = np.average(cpu_traces)
-        current_std = np.std(cpu_traces)
+        current_avg, current_std = self.object_wrapper.get_slices_raw_metric_moments('cpu_usage')
         is_stable = current_slice.is_cpu_stable()
         
         # Retrieve last slice intel
@@ -154,9 +161,7 @@ class GreedyOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
         # Retrieve current context
         current_slice = self.object_wrapper.get_last_slice()
-        mem_traces = self.object_wrapper.get_slices_raw_metric('mem_usage')
-        current_avg = np.average(mem_traces)
-        current_std = np.std(mem_traces)
+        current_avg, current_std = self.object_wrapper.get_slices_raw_metric_moments('mem_usage')
         is_stable = current_slice.is_mem_stable()
 
         # Retrieve last slice intel
@@ -181,12 +186,14 @@ class GreedyOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
 class NSigmaOversubscriptionComputation(NodeBasedOversubscriptionComputation):
 
+    required_metrics = ["cpu_usage", "mem_usage"]
+
     def __init__(self, N : int):
         self.N = 5
 
     def __compute_generic_tiers(self, metric : str):
-        values = self.object_wrapper.get_slices_raw_metric(metric)
-        generic_tier0 = np.average(values) + (self.N * np.std(values))
+        average, std = self.object_wrapper.get_slices_raw_metric_moments(metric)
+        generic_tier0 = average + (self.N * std)
         return generic_tier0, generic_tier0
 
     def compute_cpu_tiers(self):
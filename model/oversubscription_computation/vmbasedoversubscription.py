@@ -1,10 +1,13 @@
 from model.slicevmwrapper import SliceVmWrapper
-import numpy as np
 import math
 
 # Abstract class
 class VmBasedOversubscriptionComputation(object):
 
+    # Raw metrics read on the slices window and statistics read on slices, others are neither fetched nor computed
+    required_metrics = list()
+    required_statistics = list()
+
     def set_context(self, object_wrapper_list : list):
         self.object_wrapper_list = object_wrapper_list
 
@@ -41,28 +44,30 @@ class VmBasedOversubscriptionComputation(object):
 
 class RClikeOversubscriptionComputation(VmBasedOversubscriptionComputation):
 
+    required_metrics = ["cpu_usage", "mem_usage"]
+
     def __init__(self, cpu_percentile : int, mem_percentile : int):
         self.cpu_percentile = cpu_percentile
         self.mem_percentile = mem_percentile
 
     def compute_cpu_tiers_vm(self, vmwrapper : SliceVmWrapper):
-        values = vmwrapper.get_slices_raw_metric('cpu_usage')
+        values_count = vmwrapper.get_slices_raw_metric_count('cpu_usage')
         generic_tier0 = 0
-        if (not vmwrapper.is_vm_ended()) and values: # In dump file, non yet deployed VM are marked with empty values
+        if (not vmwrapper.is_vm_ended()) and values_count: # In dump file, non yet deployed VM are marked with empty values
             config = vmwrapper.get_last_slice().get_cpu_config()
             if vmwrapper.is_historical_full():
-                generic_tier0 = np.percentile(values, self.cpu_percentile)*config # convert percent to cores
+                generic_tier0 = vmwrapper.get_slices_raw_metric_percentile('cpu_usage', self.cpu_percentile)*config # convert percent to cores
                 if generic_tier0>config: generic_tier0=config # incoherent values (libvirt aggregation issue?)
             else: # not enough value, we use config
                 generic_tier0 = config
         return generic_tier0, generic_tier0
 
     def compute_mem_tiers_vm(self, vmwrapper : SliceVmWrapper):
-        values = vmwrapper.get_slices_raw_metric('mem_usage')
+        values_count = vmwrapper.get_slices_raw_metric_count('mem_usage')
         generic_tier0 = 0
-        if (not vmwrapper.is_vm_ended()) and values: # In dump file, non yet deployed VM are marked with empty values
+        if (not vmwrapper.is_vm_ended()) and values_count: # In dump file, non yet deployed VM are marked with empty values
             if vmwrapper.is_historical_full():
-                generic_tier0 = np.percentile(values, self.mem_percentile)
+                generic_tier0 = vmwrapper.get_slices_raw_metric_percentile('mem_usage', self.mem_percentile)
             else: # not enough value, we use config
                 generic_tier0 = vmwrapper.get_last_slice().get_mem_config()
         return generic_tier0, generic_tier0
@@ -0,0 +1,90 @@
+import numpy as np
+
+class QuantileSketch(object):
+
+    # DDSketch (Masson et al., VLDB 2019): values are counted in logarithmic buckets, bucket i holding ]gamma^(i-1), gamma^i]
+    # with gamma = (1+accuracy)/(1-accuracy), so that any quantile is returned with a relative error bounded by accuracy
+    # Sketches of a same accuracy are merged by adding their bucket counts, the merged sketch has the same error bound
+    # Usage metrics span a few decades, buckets are therefore never collapsed (a thousand buckets at 1% for 9 decades)
+    def __init__(self, accuracy : float = 0.01):
+        if not (0 < accuracy < 1):
+            raise ValueError("Sketch accuracy must be in ]0, 1[, got " + str(accuracy))
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy)/(1 - accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.positive_keys, self.positive_counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64) # sorted keys
+        self.negative_keys, self.negative_counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64) # keys of absolute values
+        self.zero_count = 0
+        self.nan_count = 0
+        self.count = 0
+        self.min = np.inf # exact bounds, returned for percentiles 0 and 100
+        self.max = -np.inf
+
+    @staticmethod
+    def count_keys(keys : np.ndarray, counts : np.ndarray):
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        return unique_keys, np.bincount(inverse, weights=counts, minlength=unique_keys.size).astype(np.int64)
+
+    def get_keys(self, values : np.ndarray):
+        return np.ceil(np.log(values)/self.log_gamma).astype(np.int64)
+
+    def get_representatives(self, keys : np.ndarray):
+        # Middle of the bucket in relative terms: at most accuracy away from any value of the bucket
+        return 2*np.power(self.gamma, keys.astype(np.float64))/(self.gamma + 1)
+
+    def add(self, values : np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        nan = np.isnan(values)
+        self.nan_count += int(nan.sum())
+        values = values[~nan]
+        if values.size == 0:
+            return self
+        positive, negative = values[values > 0], -values[values < 0]
+        self.positive_keys, self.positive_counts = QuantileSketch.count_keys(np.concatenate((self.positive_keys, self.get_keys(positive))),
+                                                                             np.concatenate((self.positive_counts, np.ones(positive.size, dtype=np.int64))))
+        self.negative_keys, self.negative_counts = QuantileSketch.count_keys(np.concatenate((self.negative_keys, self.get_keys(negative))),
+                                                                             np.concatenate((self.negative_counts, np.ones(negative.size, dtype=np.int64))))
+        self.zero_count += values.size - positive.size - negative.size
+        self.count += values.size
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        return self
+
+    @staticmethod
+    def from_values(values : np.ndarray, accuracy : float = 0.01):
+        return QuantileSketch(accuracy).add(values)
+
+    @staticmethod
+    def merge_all(sketches : list, accuracy : float = 0.01):
+        merged = QuantileSketch(accuracy)
+        for sketch in sketches:
+            if sketch.accuracy != accuracy:
+                raise ValueError("Sketches of accuracy " + str(sketch.accuracy) + " and " + str(accuracy) + " cannot be merged")
+        if not sketches:
+            return merged
+        merged.positive_keys, merged.positive_counts = QuantileSketch.count_keys(np.concatenate([sketch.positive_keys for sketch in sketches]),
+                                                                                 np.concatenate([sketch.positive_counts for sketch in sketches]))
+        merged.negative_keys, merged.negative_counts = QuantileSketch.count_keys(np.concatenate([sketch.negative_keys for sketch in sketches]),
+                                                                                 np.concatenate([sketch.negative_counts for sketch in sketches]))
+        merged.zero_count = sum([sketch.zero_count for sketch in sketches])
+        merged.nan_count = sum([sketch.nan_count for sketch in sketches])
+        merged.count = sum([sketch.count for sketch in sketches])
+        merged.min = min([sketch.min for sketch in sketches])
+        merged.max = max([sketch.max for sketch in sketches])
+        return merged
+
+    def get_quantile(self, percentile : float):
+        # Same rank definition as np.percentile (linear interpolation between closest ranks), on bucket representatives
+        if (self.count == 0) or (self.nan_count > 0):
+            return np.nan
+        if percentile <= 0:
+            return self.min
+        if percentile >= 100:
+            return self.max
+        # Buckets in ascending order of values: negatives (largest absolute value first), zeros, positives
+        values = np.concatenate((-self.get_representatives(self.negative_keys[::-1]), [0.0], self.get_representatives(self.positive_keys)))
+        cumulated = np.cumsum(np.concatenate((self.negative_counts[::-1], [self.zero_count], self.positive_counts)))
+        rank = percentile/100*(self.count - 1)
+        lower, upper = np.searchsorted(cumulated, [np.floor(rank), np.ceil(rank)], side='right')
+        quantile = values[lower] + (rank - np.floor(rank))*(values[upper] - values[lower])
+        return min(max(quantile, self.min), self.max)
@@ -0,0 +1,67 @@
+import os, tempfile
+import numpy as np
+
+class RawDataStore(object):
+
+    # Raw samples released by slices (spill retention) are appended to an anonymous temporary file and read back on demand
+    # Samples of slices leaving the historical window are discarded, the file being compacted once mostly made of discarded samples
+    def __init__(self, directory : str = None, compaction_size : int = 1 << 20):
+        self.directory = directory
+        self.compaction_size = compaction_size # bytes, smaller files are never compacted
+        self.pid = os.getpid() # a store is never shared with forked processes
+        self.file = tempfile.TemporaryFile(prefix="scroogevm-", suffix=".raw", dir=directory)
+        self.index = dict() # key -> {metric: (offset, dtype, size)}
+        self.next_key = 0
+        self.file_size = 0
+        self.live_size = 0
+
+    @staticmethod
+    def get_entry_size(entry : dict):
+        return sum([np.dtype(dtype).itemsize*size for offset, dtype, size in entry.values()])
+
+    def write_arrays(self, file, arrays : dict, offset : int):
+        entry = dict()
+        for metric, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            file.seek(offset)
+            file.write(values.tobytes())
+            entry[metric] = (offset, values.dtype.str, values.size)
+            offset += values.nbytes
+        return entry, offset
+
+    def put(self, arrays : dict):
+        entry, self.file_size = self.write_arrays(self.file, arrays, self.file_size)
+        self.file.flush() # read back without the file object
+        key = self.next_key
+        self.next_key += 1
+        self.index[key] = entry
+        self.live_size += RawDataStore.get_entry_size(entry)
+        return key
+
+    def get(self, key : int, metric : str):
+        offset, dtype, size = self.index[key][metric]
+        return np.frombuffer(os.pread(self.file.fileno(), np.dtype(dtype).itemsize*size, offset), dtype=dtype)
+
+    def get_all(self, key : int):
+        return {metric : self.get(key, metric) for metric in self.index[key].keys()}
+
+    def discard(self, key : int):
+        entry = self.index.pop(key, None)
+        if entry is None:
+            return
+        self.live_size -= RawDataStore.get_entry_size(entry)
+        if (self.file_size > self.compaction_size) and (self.file_size > 2*self.live_size):
+            self.compact()
+
+    def compact(self):
+        # Live samples are copied to a new file, keys are unchanged
+        file = tempfile.TemporaryFile(prefix="scroogevm-", suffix=".raw", dir=self.directory)
+        offset = 0
+        for key in list(self.index.keys()):
+            self.index[key], offset = self.write_arrays(file, self.get_all(key), offset)
+        file.flush()
+        self.file.close()
+        self.file, self.file_size = file, offset
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,236 @@
+from model.dumpreader import DumpReader
+from model.slicemodel import SliceModel
+from model.sliceobject import SliceObject
+import numpy as np
+
+# Row oriented kernels: ragged samples are stored as NaN padded 2-D arrays (one row per slice or per window)
+def pad_rows(rows : list):
+    width = max([len(row) for row in rows], default=0)
+    matrix = np.full((len(rows), width), np.nan, dtype=np.float64)
+    for index, row in enumerate(rows):
+        matrix[index, :len(row)] = row
+    return matrix
+
+def window_rows(matrix : np.ndarray, window : int):
+    # Row k is the concatenation of rows [k-window+1, k], first rows use the available history only
+    padded = np.concatenate((np.full((window-1, matrix.shape[1]), np.nan), matrix), axis=0)
+    view = np.lib.stride_tricks.sliding_window_view(padded, window, axis=0) # (rows, width, window)
+    return view.transpose(0, 2, 1).reshape(matrix.shape[0], window*matrix.shape[1])
+
+def compact_rows(matrix : np.ndarray, keep_order : bool = True):
+    # Valid values are moved to the front of their row, in their original order when required (sum based statistics depend on it)
+    valid = ~np.isnan(matrix)
+    if keep_order:
+        matrix = np.take_along_axis(matrix, np.argsort(~valid, axis=-1, kind='stable'), axis=-1)
+    else:
+        matrix = np.sort(matrix, axis=-1)
+    return matrix, valid.sum(axis=-1)
+
+def reduce_rows(matrix : np.ndarray, counts : np.ndarray, function, shape : tuple = tuple()):
+    # Rows are grouped by their number of values so that each group is computed with a single call, as a list of this length would be
+    result = np.full(shape + (matrix.shape[0],), np.nan)
+    for count in np.unique(counts):
+        if count == 0:
+            continue # no value, as an empty list
+        mask = (counts == count)
+        result[..., mask] = function(np.ascontiguousarray(matrix[mask, :count]))
+    return result
+
+def aggregate_rows(matrix : np.ndarray, counts : np.ndarray, aggregation : int):
+    # Same aggregation as SliceObject, applied on each group of rows of same length
+    if aggregation <= 1:
+        return matrix, counts
+    aggregated_counts = np.array([SliceObject.get_aggregated_length(count, aggregation) for count in counts], dtype=counts.dtype)
+    aggregated = np.full((matrix.shape[0], max(1, int(aggregated_counts.max(initial=0)))), np.nan)
+    for count in np.unique(counts):
+        if count == 0:
+            continue
+        mask = (counts == count)
+        aggregated[mask, :SliceObject.get_aggregated_length(count, aggregation)] = SliceObject.aggregate_array(matrix[mask, :count], aggregation)
+    return aggregated, aggregated_counts
+
+def merge_moment_rows(moments_a : tuple, moments_b : tuple):
+    # Same update as SliceBuffer.merge_moments, applied element-wise on arrays of (count, mean, sum of squared deviations)
+    count_a, mean_a, m2_a = moments_a
+    count_b, mean_b, m2_b = moments_b
+    count = count_a + count_b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = mean_b - mean_a
+        mean = mean_a + delta*count_b/count
+        m2 = m2_a + m2_b + delta*delta*count_a*count_b/count
+    mean = np.where(count_a == 0, mean_b, np.where(count_b == 0, mean_a, mean))
+    m2 = np.where(count_a == 0, m2_b, np.where(count_b == 0, m2_a, m2))
+    return count, mean, m2
+
+def window_moments(counts : np.ndarray, means : np.ndarray, m2s : np.ndarray, window : int):
+    # Moments of row k are merged from rows [k-window+1, k], oldest first, as a SliceBuffer holding these slices would do
+    moments = (np.zeros_like(counts), np.zeros(counts.size), np.zeros(counts.size))
+    for offset in range(window-1, -1, -1):
+        shift = min(offset, counts.size)
+        shifted = tuple(np.concatenate((np.zeros(shift, dtype=x.dtype), x[:counts.size-shift])) for x in (counts, means, m2s))
+        moments = merge_moment_rows(moments, shifted)
+    return moments
+
+class VectorizedReplayEngine(object):
+
+    # Strategies which only depend on a sliding window over the trace: tiers of every occurence are computed at once
+    supported_strategies = ["percentile", "nsigma", "borg", "rclike"]
+
+    def __init__(self, dump : DumpReader, historical_occurences : int, cpu_percentile : int, mem_percentile : int, strategy : str, aggregation : int):
+        if strategy not in VectorizedReplayEngine.supported_strategies:
+            raise ValueError("Strategy " + strategy + " is not supported by the vectorized engine, must be in " + str(VectorizedReplayEngine.supported_strategies))
+        self.dump = dump
+        self.config = dump.get_config()
+        self.historical_occurences = historical_occurences
+        self.cpu_percentile = cpu_percentile
+        self.mem_percentile = mem_percentile
+        self.strategy = strategy
+        self.aggregation = aggregation
+        self.number_of_slice = int(self.config["node_scope"]/self.config["slice_scope"])
+        self.window = historical_occurences+1 # as SliceObjectWrapper.get_historical_maxlength()
+
+    def get_equality_key(self, raw_data : dict):
+        # SliceVm equality relies on statistics of these metrics, a VM ended in the trace repeats its last raw data
+        memory_metric = "mem_rss" if "mem_rss" in raw_data else "mem_usage"
+        return [raw_data.get(metric, list()) for metric in ["time", "cpu_usage", memory_metric, "swpagefaults", "sched_busy"]]
+
+    def get_last_value(self, raw_data : dict, metric : str):
+        return raw_data[metric][-1] if raw_data.get(metric, False) else None
+
+    def load(self):
+        # Single pass over the trace, only metrics used by the supported strategies are kept
+        self.epoch, self.node_cpu_usage, self.node_mem_usage, self.cpu_config, self.mem_config = list(), list(), list(), list(), list()
+        self.booked_cpu, self.booked_mem = list(), list()
+        self.vm_list = None
+        vm_state = dict() # (position, vm) -> [last added key, ended]
+        self.vm_added = list() # per occurence, per vm: (index of last added slice, ended)
+        self.vm_slices = dict() # (position, vm) -> list of (cpu_usage, mem_usage, cpu config, mem config)
+        for occurence_data in self.dump:
+            occurence, node = occurence_data["occurence"], occurence_data["node"]
+            if not node:
+                raise ValueError("Occurence " + str(occurence) + " has no node data, not supported by the vectorized engine")
+            position = occurence % self.number_of_slice
+            if self.vm_list is None:
+                self.vm_list = list(occurence_data["vm"].keys())
+            self.epoch.append(occurence_data["epoch"])
+            self.node_cpu_usage.append(node.get("cpu_usage", list()))
+            self.node_mem_usage.append(node.get("mem_usage", list()))
+            self.cpu_config.append(self.get_last_value(node, "cpu"))
+            self.mem_config.append(self.get_last_value(node, "mem"))
+            booked_cpu, booked_mem = 0, 0
+            vm_added = list()
+            for domain_name in self.vm_list:
+                raw_data = occurence_data["vm"].get(domain_name, dict())
+                state = vm_state.setdefault((position, domain_name), [None, False])
+                slices = self.vm_slices.setdefault((position, domain_name), list())
+                if raw_data: # empty for VM not started yet
+                    key = self.get_equality_key(raw_data)
+                    if key == state[0]:
+                        state[1] = True # VM ended
+                    else:
+                        state[0] = key
+                        slices.append((raw_data.get("cpu_usage", list()), raw_data.get("mem_usage", list()),
+                                       self.get_last_value(raw_data, "cpu"), self.get_last_value(raw_data, "mem")))
+                        cpu, mem = self.get_last_value(raw_data, "cpu"), self.get_last_value(raw_data, "mem")
+                        booked_cpu+= cpu if cpu is not None else 0
+                        booked_mem+= mem if mem is not None else 0
+                vm_added.append((len(slices)-1, state[1]))
+            self.vm_added.append(vm_added)
+            self.booked_cpu.append(booked_cpu)
+            self.booked_mem.append(booked_mem)
+
+    def get_positions(self):
+        return [np.arange(position, len(self.epoch), self.number_of_slice) for position in range(self.number_of_slice)]
+
+    def compute_node_window_tiers(self, samples : list, percentile : int = None):
+        # Node based strategies: statistic over raw samples of the last historical slices at the same position
+        tiers = np.full(len(self.epoch), np.nan)
+        for occurences in self.get_positions():
+            if occurences.size == 0:
+                continue
+            rows = pad_rows([samples[occurence] for occurence in occurences])
+            if percentile is not None:
+                windows, counts = compact_rows(window_rows(rows, self.window), keep_order=False)
+                tiers[occurences] = reduce_rows(windows, counts, lambda rows: np.percentile(rows, percentile, axis=-1))
+            else: # nsigma, from per slice moments
+                counts = np.array([len(samples[occurence]) for occurence in occurences], dtype=np.int64)
+                means = np.where(counts > 0, reduce_rows(rows, counts, lambda rows: np.mean(rows, axis=-1)), 0.0) # empty slices as (0, 0, 0)
+                m2s = np.where(counts > 0, reduce_rows(rows, counts, lambda rows: np.sum(np.square(rows - np.mean(rows, axis=-1)[:, np.newaxis]), axis=-1)), 0.0)
+                count, mean, m2 = window_moments(counts, means, m2s, self.window)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    tiers[occurences] = np.where(count > 0, mean + (5 * np.sqrt(m2/count)), np.nan)
+        return tiers
+
+    def compute_vm_window_percentile(self):
+        # rclike: per VM percentile over its last historical slices, indexed by slice
+        vm_percentile = dict()
+        for key, slices in self.vm_slices.items():
+            if not slices:
+                continue
+            cpu_windows, cpu_counts = compact_rows(window_rows(pad_rows([slice[0] for slice in slices]), self.window), keep_order=False)
+            mem_windows, mem_counts = compact_rows(window_rows(pad_rows([slice[1] for slice in slices]), self.window), keep_order=False)
+            vm_percentile[key] = (reduce_rows(cpu_windows, cpu_counts, lambda rows: np.percentile(rows, 99, axis=-1)), cpu_counts,
+                                  reduce_rows(mem_windows, mem_counts, lambda rows: np.percentile(rows, 100, axis=-1)), mem_counts)
+        return vm_percentile
+
+    def compute_rclike_tiers(self, occurence : int, vm_percentile : dict):
+        # Same summation order and rules as RClikeOversubscriptionComputation
+        position = occurence % self.number_of_slice
+        cpu_tier, mem_tier = 0, 0
+        for domain_name, (index, ended) in zip(self.vm_list, self.vm_added[occurence]):
+            if ended or (index < 0):
+                continue
+            cpu_percentile, cpu_counts, mem_percentile, mem_counts = vm_percentile[(position, domain_name)]
+            cpu_config, mem_config = self.vm_slices[(position, domain_name)][index][2:]
+            is_historical_full = (index+1) >= self.window
+            if cpu_counts[index] > 0:
+                if is_historical_full:
+                    vm_cpu_tier = cpu_percentile[index]*cpu_config
+                    if vm_cpu_tier>cpu_config: vm_cpu_tier=cpu_config
+                else:
+                    vm_cpu_tier = cpu_config
+                cpu_tier += vm_cpu_tier
+            if mem_counts[index] > 0:
+                mem_tier += mem_percentile[index] if is_historical_full else mem_config
+        return cpu_tier, mem_tier
+
+    def compute_node_statistics(self, samples : list):
+        # Percentiles dumped by SliceHost, computed on aggregated samples
+        matrix, counts = compact_rows(pad_rows(samples), keep_order=True)
+        matrix, counts = aggregate_rows(matrix, counts, self.aggregation)
+        percentiles = reduce_rows(matrix, counts, lambda rows: np.percentile(rows, SliceObject.usage_percentiles, axis=-1), shape=(len(SliceObject.usage_percentiles),))
+        return [dict(zip(SliceObject.usage_percentiles, percentiles[:, occurence])) if counts[occurence] > 0 else dict() for occurence in range(len(samples))]
+
+    def replay(self, from_occurence : int = 0):
+        self.load()
+        if self.strategy == "percentile":
+            cpu_tiers = self.compute_node_window_tiers(self.node_cpu_usage, percentile=self.cpu_percentile)
+            mem_tiers = self.compute_node_window_tiers(self.node_mem_usage, percentile=self.mem_percentile)
+        elif self.strategy == "nsigma":
+            cpu_tiers = self.compute_node_window_tiers(self.node_cpu_usage)
+            mem_tiers = self.compute_node_window_tiers(self.node_mem_usage)
+        elif self.strategy == "rclike":
+            vm_percentile = self.compute_vm_window_percentile()
+        dump_dict = {"epoch": list(), "config": {"node_scope": self.config["node_scope"], "slice_scope": self.config["slice_scope"], "number_of_slice": self.number_of_slice,
+                     "historical_occurences": self.historical_occurences, "node_name": self.config["node_name"]},
+                     "node": {"cpu_config": list(), "mem_config": list(), "booked_cpu": list(), "booked_mem": list()}, "vm": dict(),
+                     "model": {x : list() for x in ["free_cpu", "free_mem", "cpu_tier0", "cpu_tier1", "cpu_tier2", "mem_tier0", "mem_tier1", "mem_tier2"]}}
+        for occurence in range(from_occurence, len(self.epoch)):
+            if self.strategy == "borg":
+                cpu_tier, mem_tier = self.booked_cpu[occurence]/1.1, self.booked_mem[occurence]/1.1
+            elif self.strategy == "rclike":
+                cpu_tier, mem_tier = self.compute_rclike_tiers(occurence, vm_percentile)
+            else:
+                cpu_tier, mem_tier = cpu_tiers[occurence], mem_tiers[occurence]
+            tiers = SliceModel.compute_cpu_mem_tiers_quantities(slice_cpu_tier0=cpu_tier, slice_cpu_tier1=cpu_tier, cpu_config=self.cpu_config[occurence],
+                                                                slice_mem_tier0=mem_tier, slice_mem_tier1=mem_tier, mem_config=self.mem_config[occurence])
+            dump_dict["model"]["free_cpu"].append(tiers[2] if tiers[2] >= 0 else 0) # as NodeModel.get_free_cpu_mem
+            dump_dict["model"]["free_mem"].append(tiers[5] if tiers[5] >= 0 else 0)
+            for attribute, value in zip(["cpu_tier0", "cpu_tier1", "cpu_tier2", "mem_tier0", "mem_tier1", "mem_tier2"], tiers):
+                dump_dict["model"][attribute].append(value)
+            for attribute in ["cpu_config", "mem_config", "booked_cpu", "booked_mem"]:
+                dump_dict["node"][attribute].append(getattr(self, attribute)[occurence])
+            dump_dict["epoch"].append(self.epoch[occurence])
+        dump_dict["node"]["cpu_percentile"] = self.compute_node_statistics(self.node_cpu_usage[from_occurence:])
+        dump_dict["node"]["mem_percentile"] = self.compute_node_statistics(self.node_mem_usage[from_occurence:])
+        return dump_dict
@@ -0,0 +1,56 @@
+import numpy as np
+
+class SamplePyramid(object):
+
+    # Chunk sums of samples at increasing aggregation levels, each level being derived from the coarsest filled level dividing it
+    # (e.g. 90 from 30, 30 from 15) instead of from raw samples. Levels are filled on first request and kept, so that
+    # statistics at several aggregations of a same slice (sweeps, coarse aggregation) walk raw samples only once
+    # Samples may be a 1-D array or a 2-D array of rows of same length, chunks are taken along the last axis
+    levels = [1, 5, 15, 30, 60, 90]
+
+    def __init__(self, samples : np.ndarray):
+        samples = np.asarray(samples)
+        if samples.dtype.kind != "f":
+            samples = samples.astype(np.float64)
+        self.length = samples.shape[-1]
+        self.sums = {1: samples} # aggregation -> sums of complete chunks
+
+    @staticmethod
+    def get_aggregated_length(length : int, aggregation : int):
+        if (aggregation <= 1) or (length == 0):
+            return length
+        if length > aggregation:
+            return length // aggregation # last value removed if uncomplete
+        return 1 # a single uncomplete chunk is kept
+
+    def get_base_level(self, aggregation : int):
+        # Coarsest pyramid level dividing aggregation, filled on the way
+        base = 1
+        for level in SamplePyramid.levels:
+            if (1 < level < aggregation) and (aggregation % level == 0):
+                base = level
+        if base > 1:
+            self.get_sums(base)
+        return base
+
+    def get_sums(self, aggregation : int):
+        # Sums of the complete chunks, requires length > aggregation
+        if aggregation not in self.sums:
+            base = self.get_base_level(aggregation)
+            factor = aggregation // base
+            base_sums = self.sums[base]
+            count = self.length // aggregation
+            chunks = base_sums[..., :count*factor].reshape(base_sums.shape[:-1] + (count, factor))
+            self.sums[aggregation] = chunks.sum(axis=-1)
+        return self.sums[aggregation]
+
+    def get_aggregated(self, aggregation : int, sum : bool = False):
+        # Chunks of aggregation samples are averaged (or summed), the last one being removed if uncomplete
+        samples = self.sums[1]
+        if SamplePyramid.get_aggregated_length(self.length, aggregation) == self.length:
+            return samples
+        if self.length <= aggregation: # a single uncomplete chunk
+            chunks = samples.reshape(samples.shape[:-1] + (1, self.length))
+            return chunks.sum(axis=-1) if sum else chunks.mean(axis=-1)
+        sums = self.get_sums(aggregation)
+        return sums if sum else sums/aggregation
@@ -0,0 +1,72 @@
+import numpy as np
+from collections import deque
+
+class SliceBuffer(object):
+
+    # Samples of a metric over the historical slices of a wrapper, oldest first, in a single preallocated array
+    # Slices are appended at the end and removed from the start, the live window [start, end[ stays contiguous
+    # so it is handed out as a view. Live samples are moved back to the front only when the end is reached
+    def __init__(self, dtype = np.float64, capacity : int = 0):
+        self.buffer = np.empty(capacity, dtype=dtype)
+        self.start = 0
+        self.end = 0
+        self.lengths = deque()
+        self.moments = deque() # (count, mean, sum of squared deviations) of each slice
+
+    def reserve(self, length : int, dtype):
+        live_length = self.end - self.start
+        if (dtype == self.buffer.dtype) and (self.end + length <= self.buffer.size):
+            return
+        if (dtype == self.buffer.dtype) and (live_length + length <= self.buffer.size):
+            self.buffer[:live_length] = self.buffer[self.start:self.end] # compaction, slices may overlap
+        else: # growth or upcast (e.g. integer samples followed by float ones, as a concatenation would do)
+            buffer = np.empty(2*(live_length + length), dtype=dtype)
+            buffer[:live_length] = self.buffer[self.start:self.end]
+            self.buffer = buffer
+        self.start, self.end = 0, live_length
+
+    def append(self, values : np.ndarray):
+        dtype = np.result_type(self.buffer.dtype, values.dtype) if self.end > self.start else values.dtype
+        self.reserve(values.size, dtype)
+        self.buffer[self.end:self.end+values.size] = values
+        self.end += values.size
+        self.lengths.append(values.size)
+        self.moments.append(SliceBuffer.compute_moments(values))
+
+    def pop_oldest(self):
+        self.start += self.lengths.popleft()
+        self.moments.popleft()
+        if self.start == self.end: # empty, next slices are written from the front
+            self.start, self.end = 0, 0
+
+    def get_window(self):
+        window = self.buffer[self.start:self.end]
+        window.flags.writeable = False # view on the buffer, valid until the next append
+        return window
+
+    @staticmethod
+    def compute_moments(values : np.ndarray):
+        if values.size == 0:
+            return 0, 0.0, 0.0
+        mean = np.mean(values)
+        return values.size, mean, np.sum(np.square(values - mean))
+
+    @staticmethod
+    def merge_moments(moments_a : tuple, moments_b : tuple):
+        # Chan et al. pairwise update of (count, mean, sum of squared deviations)
+        count_a, mean_a, m2_a = moments_a
+        count_b, mean_b, m2_b = moments_b
+        if count_a == 0:
+            return moments_b
+        if count_b == 0:
+            return moments_a
+        count = count_a + count_b
+        delta = mean_b - mean_a
+        return count, mean_a + delta*count_b/count, m2_a + m2_b + delta*delta*count_a*count_b/count
+
+    def get_moments(self):
+        # Window moments from the per slice ones, in O(number of slices)
+        moments = (0, 0.0, 0.0)
+        for slice_moments in self.moments:
+            moments = SliceBuffer.merge_moments(moments, slice_moments)
+        return moments
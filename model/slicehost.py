@@ -2,11 +2,12 @@ from model.sliceobject import SliceObject
 
 class SliceHost(SliceObject):
 
+    # cpu_ratio and mem_ratio are only set by the greedy strategy
+    __slots__ = ("vm_list", "booked_cpu", "booked_mem", "cpu_stable_state", "mem_stable_state", "cpu_ratio", "mem_ratio")
+
     def __init__(self, slice_object : SliceObject, vm_list : list, booked_cpu : int, booked_mem):
-        # Retrieve parent attribute for computation
-        slice_attributes = slice_object.__dict__
-        slice_attributes["compute"] = True
-        super().__init__(**slice_attributes)
+        # Retrieve parent raw data for computation
+        super().__init__(raw_data=slice_object.raw_data, aggregation=slice_object.aggregation, compute=True)
         # Specific attributes
         self.vm_list=vm_list
         self.booked_cpu=booked_cpu
@@ -32,7 +33,7 @@ class SliceHost(SliceObject):
         return (self.oc_page_fault>100000); # TODO value
 
     def set_cpu_stability(self, stable : bool):
-        self.stable_state=stable
+        self.cpu_stable_state=stable
 
     def set_stability(self, cpu_stability : bool, mem_stability : bool):
         self.cpu_stable_state=cpu_stability
@@ -51,7 +52,7 @@ class SliceHost(SliceObject):
         return self.booked_mem
 
     def dump_state_to_dict(self, dump_dict : dict, iteration : int = 0):
-        for attribute, value in self.__dict__.items():
+        for attribute, value in self.get_dump_state():
             if attribute not in dump_dict:
                 if attribute in ["raw_data", "cpu_percentile", "mem_percentile", "cpi", "hwcpucycles"]:
                     dump_dict[attribute] = [dict() for x in range(iteration)] # in case of new host
@@ -1,15 +1,26 @@
 from model.sliceobjectwrapper import SliceObjectWrapper
+from model.sliceobject import SliceObject
 from model.slicehost import SliceHost
-from model.stability_assesser.stabilityassesserlstm import StabilityAssesserLstm
+from model.stability_assesser.stabilityassesserforecast import StabilityAssesserForecast
 from model.oversubscription_computation.nodebasedoversubscription import NodeBasedOversubscriptionComputation
 import numpy as np
 
 class SliceHostWrapper(SliceObjectWrapper):
 
-    def __init__(self, host_name : str, historical_occurences : int, cpu_percentile : int, mem_percentile : int, strategy : str, aggregation : int):
+    # Static, stability verdicts precomputed offline, keyed by (host name, occurence)
+    stability_verdicts = None
+    # Static, stability backend: "lstm" (TensorFlow, as in the paper) or "ar" (NumPy autoregressive model), imported on first assessment
+    stability_backends = ["lstm", "ar"]
+    stability_backend = "lstm"
+    # Static, batched stability assessments resolved once per slice boundary (StabilityService), None to assess each slice on its own
+    stability_service = None
+
+    def __init__(self, host_name : str, historical_occurences : int, cpu_percentile : int, mem_percentile : int, strategy : str, aggregation : int, position : int = 0):
         super().__init__(historical_occurences, cpu_percentile, mem_percentile, aggregation)
         self.host_name=host_name
         self.strategy=strategy
+        self.position=position
+        self.pending_stability=False
 
     def add_slice_data_from_raw(self, host_data : dict):
         if(len(host_data.keys()) == 0):
@@ -21,16 +32,54 @@ class SliceHostWrapper(SliceObjectWrapper):
         slice_host.set_stability(cpu_stability, mem_stability)
         self.add_slice(slice_host)
 
-    def add_slice_data_from_dump(self, dump_data : dict, occurence : int):
-        if(len(dump_data.keys()) == 0):
+    def add_slice_data_from_dump(self, occurence_data : dict):
+        if(len(occurence_data["node"].keys()) == 0):
             print("Empty data on slice encountered on dump " + self.host_name)
             return
-        slice_host = SliceHost(slice_object=self.get_slice_object_from_dump(dump_data=dump_data["node"], occurence=occurence, epoch=dump_data["epoch"][occurence]),
-                        vm_list=dump_data["node"]["raw_data"][occurence]['vm'], booked_cpu=dump_data["node"]["booked_cpu"], booked_mem=dump_data["node"]["booked_mem"])
-        cpu_stability, mem_stability = self.compute_stability(slice_to_be_added=slice_host)
+        slice_host = SliceHost(slice_object=self.get_slice_object_from_dump(raw_data=occurence_data["node"], epoch=occurence_data["epoch"]),
+                        vm_list=occurence_data["node"]['vm'], booked_cpu=occurence_data["booked_cpu"], booked_mem=occurence_data["booked_mem"])
+        cpu_stability, mem_stability = self.compute_stability(slice_to_be_added=slice_host, occurence=occurence_data["occurence"])
         slice_host.set_stability(cpu_stability, mem_stability)
         self.add_slice(slice_host)
 
+    @staticmethod
+    def enable_stability_backend(backend : str):
+        if backend not in SliceHostWrapper.stability_backends:
+            raise ValueError("Stability backend must be in " + str(SliceHostWrapper.stability_backends))
+        SliceHostWrapper.stability_backend = backend
+
+    @staticmethod
+    def get_stability_assesser():
+        # Backends are imported here, strategies without stability never load TensorFlow
+        if SliceHostWrapper.stability_backend == "ar":
+            from model.stability_assesser.stabilityassesserar import StabilityAssesserAr
+            return StabilityAssesserAr()
+        from model.stability_assesser.stabilityassesserlstm import StabilityAssesserLstm
+        return StabilityAssesserLstm()
+
+    @staticmethod
+    def enable_stability_service(service):
+        SliceHostWrapper.stability_service = service
+        return service
+
+    @staticmethod
+    def flush_stability():
+        # Resolves assessments queued by slices built since last call
+        if SliceHostWrapper.stability_service is not None:
+            SliceHostWrapper.stability_service.flush()
+
+    def is_stability_pending(self):
+        return self.pending_stability
+
+    def resolve_stability(self, slice_host : SliceHost, cpu_stability : bool, mem_stability : bool):
+        slice_host.set_stability(cpu_stability, mem_stability)
+        self.pending_stability=False
+
+    @staticmethod
+    def enable_stability_verdicts(verdicts : dict = None):
+        SliceHostWrapper.stability_verdicts = verdicts if verdicts is not None else dict()
+        return SliceHostWrapper.stability_verdicts
+
     def get_host_config(self):
         cpu_config_list = self.get_slices_metric("cpu_config")
         mem_config_list = self.get_slices_metric("mem_config")
@@ -63,16 +112,32 @@ class SliceHostWrapper(SliceObjectWrapper):
                 return True
         return False
 
-    def compute_stability(self, slice_to_be_added : SliceHost):
+    def compute_stability(self, slice_to_be_added : SliceHost, occurence : int = None):
         if self.strategy != "scroogevm":
             return True, True
             
         if not self.is_historical_full():
             return False, False
 
-        assesser = StabilityAssesserLstm()
-        cpu_stability = assesser.assess_form_slice_list(slice_list=self.slice_object_list, new_slice=slice_to_be_added, metric='cpu_usage', max_config=slice_to_be_added.get_cpu_config())
-        mem_stability = assesser.assess_form_slice_list(slice_list=self.slice_object_list, new_slice=slice_to_be_added, metric='mem_usage', max_config=slice_to_be_added.get_mem_config())
+        if (SliceHostWrapper.stability_verdicts is not None) and ((self.host_name, occurence) in SliceHostWrapper.stability_verdicts):
+            StabilityAssesserForecast.instance_count+=1 # as if the assesser was built here, following ids are unchanged
+            return SliceHostWrapper.stability_verdicts[(self.host_name, occurence)]
+
+        if SliceHostWrapper.stability_service is not None: # queued with other assessments of the slice boundary, resolved on flush
+            if self.pending_stability: # previous slice of this position must be resolved first
+                SliceHostWrapper.flush_stability()
+            self.pending_stability=True
+            SliceHostWrapper.stability_service.submit(slice_list=self.slice_object_list, new_slice=slice_to_be_added,
+                on_verdict=lambda cpu_stability, mem_stability: self.resolve_stability(slice_to_be_added, cpu_stability, mem_stability))
+            return False, False
+
+        return SliceHostWrapper.assess_stability(slice_list=self.slice_object_list, slice_to_be_added=slice_to_be_added, model_key=(self.host_name, self.position))
+
+    @staticmethod # Only depends on raw data of slices (and on previous slices of the position with warm started models), can be computed apart from the replay
+    def assess_stability(slice_list : list, slice_to_be_added : SliceObject, model_key : tuple = None):
+        assesser = SliceHostWrapper.get_stability_assesser()
+        cpu_stability = assesser.assess_form_slice_list(slice_list=slice_list, new_slice=slice_to_be_added, metric='cpu_usage', max_config=slice_to_be_added.get_cpu_config(), model_key=model_key)
+        mem_stability = assesser.assess_form_slice_list(slice_list=slice_list, new_slice=slice_to_be_added, metric='mem_usage', max_config=slice_to_be_added.get_mem_config(), model_key=model_key)
         return cpu_stability, mem_stability  
 
     def get_cpu_mem_tiers(self,  computation : NodeBasedOversubscriptionComputation): # return cpu_tier0, cpu_tier1, mem_tier0, mem_tier1
@@ -1,7 +1,9 @@
 from model.slicevmwrapper import SliceVmWrapper
+from model.vmregistry import VmRegistry
 from model.slicehostwrapper import SliceHostWrapper
-from influxdb_client import InfluxDBClient
-from influxdb_client.client.write_api import SYNCHRONOUS
+from model.sliceobject import SliceObject
+from model.slicevm import SliceVm
+from model.slicehost import SliceHost
 from collections import defaultdict
 from model.oversubscription_computation.vmbasedoversubscription import *
 from model.oversubscription_computation.nodebasedoversubscription import *
@@ -9,9 +11,14 @@ import os
 
 class SliceModel(object):
 
+    # Computations used by each strategy (see update_cpu_mem_tiers), declaring the raw metrics and statistics they read
+    strategy_computations = {'percentile': [PercentileOversubscriptionComputation], 'doa': [DoaOversubscriptionComputation],
+        'scroogevm': [GreedyOversubscriptionComputation], 'nsigma': [NSigmaOversubscriptionComputation], 'borg': [BorgDefaultOversubscriptionComputation],
+        'rclike': [RClikeOversubscriptionComputation], 'maxpeak': [NSigmaOversubscriptionComputation, RClikeOversubscriptionComputation]}
+
     def __init__(self, model_node_name : str, model_position : int, model_init_epoch : int, 
         model_historical_occurences : int, model_number_of_slice : int, leftBound : int, rightBound : int,
-        cpu_percentile : int, mem_percentile : int, strategy : int, aggregation : int):
+        cpu_percentile : int, mem_percentile : int, strategy : int, aggregation : int, vm_registry : VmRegistry = None):
         #Data related to model
         self.model_historical_occurences=model_historical_occurences
         self.model_node_name=model_node_name
@@ -27,8 +34,11 @@ class SliceModel(object):
         self.rightBound=rightBound
         self.size=rightBound-leftBound
         # Data itself:
-        self.slicevmdata=dict()
-        self.slicenodedata=SliceHostWrapper(self.model_node_name, historical_occurences=self.model_historical_occurences, cpu_percentile=self.model_cpu_percentile, mem_percentile=self.model_mem_percentile, strategy=self.strategy, aggregation=self.model_aggregation)
+        if vm_registry is None: # not shared with other positions
+            vm_registry = VmRegistry(number_of_slice=model_number_of_slice, historical_occurences=self.model_historical_occurences, cpu_percentile=self.model_cpu_percentile,
+                                     mem_percentile=self.model_mem_percentile, aggregation=self.model_aggregation)
+        self.vm_registry=vm_registry
+        self.slicenodedata=SliceHostWrapper(self.model_node_name, historical_occurences=self.model_historical_occurences, cpu_percentile=self.model_cpu_percentile, mem_percentile=self.model_mem_percentile, strategy=self.strategy, aggregation=self.model_aggregation, position=self.model_position)
         self.cpu_tier0=None
         self.cpu_tier1=None
         self.cpu_tier2=None
@@ -45,42 +55,56 @@ class SliceModel(object):
         end_epoch = begin_epoch + self.size
         self.add_slice_data_from_epoch(begin_epoch, end_epoch)
 
-    def build_slice_from_dump(self, dump_data : dict, iteration : int):
-        self.add_slice_data_from_dump(dump_data, iteration)
+    def build_slice_from_dump(self, occurence_data : dict):
+        self.add_slice_data_from_dump(occurence_data)
 
     def add_slice_data_from_epoch(self, begin_epoch : int, end_epoch : int):
         domain_data = self.retrieve_domain_data(begin_epoch, end_epoch)
         booked_cpu, booked_mem = 0, 0
+        pending = list()
         for domain_name, domain_stats in domain_data.items():
-            if domain_name not in self.slicevmdata: # TODO : remove domain which left
-                self.slicevmdata[domain_name]=SliceVmWrapper(domain_name=domain_name, historical_occurences=self.model_historical_occurences, cpu_percentile=self.model_cpu_percentile, mem_percentile=self.model_mem_percentile, aggregation=self.model_aggregation)
+            vmwrapper = self.get_vm_wrapper(domain_name) # TODO : remove domain which left
             booked_cpu+= domain_stats["cpu"][-1] if domain_stats["cpu"] else 0
             booked_mem+= domain_stats["mem"][-1] if domain_stats["mem"] else 0
-            self.slicevmdata[domain_name].add_slice_data_from_raw(domain_stats)
+            slice_vm = vmwrapper.get_slice_vm_from_raw(domain_stats, compute=False)
+            if slice_vm is not None:
+                pending.append((vmwrapper, slice_vm))
+        SliceObject.compute_slices([slice_vm for vmwrapper, slice_vm in pending]) # statistics of all VMs at once
+        for vmwrapper, slice_vm in pending:
+            vmwrapper.add_computed_slice_from_raw(slice_vm)
         node_stats = self.retrieve_node_data(begin_epoch, end_epoch)
         node_stats["vm"] = list(domain_data.keys()) # vm id list
         node_stats["booked_cpu"] = booked_cpu
         node_stats["booked_mem"] = booked_mem
         self.slicenodedata.add_slice_data_from_raw(node_stats)
-        self.update_cpu_mem_tiers()
+        self.update_or_defer_cpu_mem_tiers()
 
-    def add_slice_data_from_dump(self, dump_data : dict, occurence : int):
+    # Occurence data are retrieved from a DumpReader: {"occurence": index, "epoch": epoch, "node": node raw data, "vm": {domain_name: vm raw data}}
+    def add_slice_data_from_dump(self, occurence_data : dict):
         booked_cpu, booked_mem = 0, 0
-        if "vm" in dump_data:
-            for domain_name, domain_dump_data in dump_data["vm"].items():
-                if domain_name not in self.slicevmdata:
-                    self.slicevmdata[domain_name]=SliceVmWrapper(domain_name=domain_name, historical_occurences=self.model_historical_occurences, cpu_percentile=self.model_cpu_percentile, mem_percentile=self.model_mem_percentile, aggregation=self.model_aggregation)
-                added = self.slicevmdata[domain_name].add_slice_data_from_dump(domain_dump_data, occurence, epoch=dump_data["epoch"][occurence])
-                if (added) and ('raw_data' in domain_dump_data) and occurence < len(domain_dump_data['raw_data']):
-                    booked_cpu+= domain_dump_data["raw_data"][occurence]['cpu'][-1] if domain_dump_data["raw_data"][occurence].get('cpu', False) and domain_dump_data["raw_data"][occurence]['cpu'][-1] is not None else 0
-                    booked_mem+= domain_dump_data["raw_data"][occurence]['mem'][-1] if domain_dump_data["raw_data"][occurence].get('mem', False) and domain_dump_data["raw_data"][occurence]['mem'][-1] is not None else 0                
-        dump_data["node"]["booked_cpu"] = booked_cpu # can be avoided on newer trace
-        dump_data["node"]["booked_mem"] = booked_mem
-        self.slicenodedata.add_slice_data_from_dump(dump_data, occurence)
-        self.update_cpu_mem_tiers()
+        pending = list()
+        for domain_name, domain_raw_data in occurence_data["vm"].items():
+            vmwrapper = self.get_vm_wrapper(domain_name)
+            slice_vm = vmwrapper.get_slice_vm_from_dump(domain_raw_data, epoch=occurence_data["epoch"], compute=False)
+            if slice_vm is not None: # VM not started yet otherwise
+                pending.append((vmwrapper, domain_raw_data, slice_vm))
+        SliceObject.compute_slices([slice_vm for vmwrapper, domain_raw_data, slice_vm in pending]) # statistics of all VMs at once
+        for vmwrapper, domain_raw_data, slice_vm in pending:
+            added = vmwrapper.add_computed_slice_from_dump(slice_vm)
+            if added:
+                booked_cpu+= domain_raw_data['cpu'][-1] if domain_raw_data.get('cpu', False) and domain_raw_data['cpu'][-1] is not None else 0
+                booked_mem+= domain_raw_data['mem'][-1] if domain_raw_data.get('mem', False) and domain_raw_data['mem'][-1] is not None else 0
+        occurence_data["booked_cpu"] = booked_cpu # can be avoided on newer trace
+        occurence_data["booked_mem"] = booked_mem
+        self.slicenodedata.add_slice_data_from_dump(occurence_data)
+        self.update_or_defer_cpu_mem_tiers()
+
+    def get_vm_wrapper(self, domain_name : str):
+        # VM is registered on this position when first seen
+        return SliceVmWrapper(registry=self.vm_registry, domain_name=domain_name, position=self.model_position)
 
     def get_vmwrapper(self):
-        return self.slicevmdata
+        return {domain_name : self.get_vm_wrapper(domain_name) for domain_name in self.vm_registry.get_domains(self.model_position)}
 
     def get_hostwrapper(self):
         return self.slicenodedata
@@ -88,6 +112,12 @@ class SliceModel(object):
     def get_cpu_mem_tiers(self):
         return self.cpu_tier0, self.cpu_tier1, self.cpu_tier2, self.mem_tier0, self.mem_tier1, self.mem_tier2
 
+    def update_or_defer_cpu_mem_tiers(self):
+        if self.slicenodedata.is_stability_pending(): # tiers need the stability of the slice, updated once resolved
+            SliceHostWrapper.stability_service.add_resolved_hook(self.update_cpu_mem_tiers)
+        else:
+            self.update_cpu_mem_tiers()
+
     def update_cpu_mem_tiers(self):
         cpu_config, mem_config = self.get_host_config()
         if (cpu_config is None) or (mem_config is None):
@@ -124,7 +154,7 @@ class SliceModel(object):
             else:
                 raise ValueError("Unknown slice oversubscription mechanism")
 
-            vmcomputation.set_context(object_wrapper_list=list(self.slicevmdata.values()))
+            vmcomputation.set_context(object_wrapper_list=list(self.get_vmwrapper().values()))
             if self.strategy == 'maxpeak': # Specific case, take the most pessimistic approach between two predictors
                 tier0_rcl, tier1_rcl = vmcomputation.compute_cpu_tiers()
                 if tier0_rcl > slice_cpu_tier0:
@@ -146,33 +176,59 @@ class SliceModel(object):
 
     # At the slice level, we compute tiers as quantities instead of threshold (TODO : change name?)
     def convert_cpu_mem_tiers(self, slice_cpu_tier0 : int, slice_cpu_tier1 : int, cpu_config : int, slice_mem_tier0 : int, slice_mem_tier1 : int, mem_config : int):
-        # Compute CPU tiers quantities from threshold
-        self.cpu_tier0 = round(slice_cpu_tier0, 1)
-        self.cpu_tier1 = round(slice_cpu_tier1 - self.cpu_tier0, 1)
-        if self.cpu_tier1 <= 0:
-            self.cpu_tier1 = 0
-        if self.cpu_tier1>cpu_config:
-            self.cpu_tier1 = cpu_config-self.cpu_tier0
-            self.cpu_tier2 = 0
+        self.cpu_tier0, self.cpu_tier1, self.cpu_tier2,\
+        self.mem_tier0, self.mem_tier1, self.mem_tier2 = SliceModel.compute_cpu_mem_tiers_quantities(slice_cpu_tier0=slice_cpu_tier0, slice_cpu_tier1=slice_cpu_tier1, cpu_config=cpu_config,
+                                                            slice_mem_tier0=slice_mem_tier0, slice_mem_tier1=slice_mem_tier1, mem_config=mem_config)
+
+    @staticmethod # Shared with the vectorized replay engine
+    def compute_cpu_mem_tiers_quantities(slice_cpu_tier0 : int, slice_cpu_tier1 : int, cpu_config : int, slice_mem_tier0 : int, slice_mem_tier1 : int, mem_config : int):
+        # Compute CPU tiers quantities from threshold
+        cpu_tier0 = round(slice_cpu_tier0, 1)
+        cpu_tier1 = round(slice_cpu_tier1 - cpu_tier0, 1)
+        if cpu_tier1 <= 0:
+            cpu_tier1 = 0
+        if cpu_tier1>cpu_config:
+            cpu_tier1 = cpu_config-cpu_tier0
+            cpu_tier2 = 0
         else:
-            self.cpu_tier2 = round(cpu_config - self.cpu_tier1 - self.cpu_tier0, 1)
-            if self.cpu_tier2<0:
-                self.cpu_tier2=0
+            cpu_tier2 = round(cpu_config - cpu_tier1 - cpu_tier0, 1)
+            if cpu_tier2<0:
+                cpu_tier2=0
 
         # Compute memory tiers quantities from threshold
-        self.mem_tier0 = int(slice_mem_tier0)
-        self.mem_tier1 = int(slice_mem_tier1 - self.mem_tier0)
-        if self.mem_tier1 < 0:
-            self.mem_tier1 = 0
-        if self.mem_tier1>mem_config:
-            self.mem_tier1 = mem_config-self.mem_tier0
-            self.mem_tier2 = 0
+        mem_tier0 = int(slice_mem_tier0)
+        mem_tier1 = int(slice_mem_tier1 - mem_tier0)
+        if mem_tier1 < 0:
+            mem_tier1 = 0
+        if mem_tier1>mem_config:
+            mem_tier1 = mem_config-mem_tier0
+            mem_tier2 = 0
         else:
-            self.mem_tier2 = int(mem_config - self.mem_tier1 - self.mem_tier0)
-            if self.mem_tier2<0:
-                self.mem_tier2=0
+            mem_tier2 = int(mem_config - mem_tier1 - mem_tier0)
+            if mem_tier2<0:
+                mem_tier2=0
+        return cpu_tier0, cpu_tier1, cpu_tier2, mem_tier0, mem_tier1, mem_tier2
         
+    @staticmethod
+    def get_strategy_requirements(strategy : str):
+        if strategy not in SliceModel.strategy_computations:
+            raise ValueError("Unknown slice oversubscription mechanism")
+        metrics, statistics = list(), list()
+        for computation in SliceModel.strategy_computations[strategy]:
+            metrics.extend([metric for metric in computation.required_metrics if metric not in metrics])
+            statistics.extend([statistic for statistic in computation.required_statistics if statistic not in statistics])
+        return metrics, statistics
+
+    @staticmethod
+    def get_field_filter(slice_class : type):
+        # Flux filter on fields required by the strategy, if any
+        fields = SliceObject.get_required_metrics(slice_class)
+        if fields is None:
+            return ''
+        return ' |> filter(fn: (r) => ' + ' or '.join(['r["_field"] == "' + field + '"' for field in fields]) + ')'
+
     def retrieve_domain_data(self, begin_epoch : int, end_epoch : int):
+        from influxdb_client import InfluxDBClient # online mode only
         myurl = os.getenv('INFLUXDB_URL')
         mytoken = os.getenv('INFLUXDB_TOKEN')
         myorg = os.getenv('INFLUXDB_ORG')
@@ -183,7 +239,7 @@ class SliceModel(object):
         query = ' from(bucket:"' + mybucket + '")\
         |> range(start: ' + str(begin_epoch) + ', stop: ' + str(end_epoch) + ')\
         |> filter(fn: (r) => r["_measurement"] == "domain")\
-        |> filter(fn: (r) => r["url"] == "' + self.model_node_name + '")'
+        |> filter(fn: (r) => r["url"] == "' + self.model_node_name + '")' + SliceModel.get_field_filter(SliceVm)
 
         result = query_api.query(org=myorg, query=query)
         domains_data = defaultdict(lambda: defaultdict(list))
@@ -198,6 +254,7 @@ class SliceModel(object):
         return domains_data
 
     def retrieve_node_data(self, begin_epoch : int, end_epoch : int):
+        from influxdb_client import InfluxDBClient # online mode only
         myurl = os.getenv('INFLUXDB_URL')
         mytoken = os.getenv('INFLUXDB_TOKEN')
         myorg = os.getenv('INFLUXDB_ORG')
@@ -208,7 +265,7 @@ class SliceModel(object):
         query = ' from(bucket:"' + mybucket + '")\
         |> range(start: ' + str(begin_epoch) + ', stop: ' + str(end_epoch) + ')\
         |> filter(fn:(r) => r._measurement == "node")\
-        |> filter(fn: (r) => r["url"] == "' + self.model_node_name + '")'
+        |> filter(fn: (r) => r["url"] == "' + self.model_node_name + '")' + SliceModel.get_field_filter(SliceHost)
 
         result = query_api.query(org=myorg, query=query)
 
@@ -231,7 +288,7 @@ class SliceModel(object):
     def get_vm_cpu_tiers_sum(self):
         slice_cpu_tier0, slice_cpu_tier1 = 0, 0
         slice_mem_tier0, slice_mem_tier1 = 0, 0
-        for vmwrapper in self.slicevmdata.values():
+        for vmwrapper in self.get_vmwrapper().values():
             wp_cpu_min, wp_cpu_max, wp_mem_min, wp_mem_max = vmwrapper.get_cpu_mem_tiers()
             slice_cpu_tier0 += wp_cpu_min if wp_cpu_min is not None else 0
             slice_cpu_tier1 += wp_cpu_max if wp_cpu_max is not None else 0
@@ -245,6 +302,6 @@ class SliceModel(object):
             " cumul cpu min/max " + str(round(slice_cpu_tier0,1)) + "/" + str(round(slice_cpu_tier1,1)) +\
             " cumul mem min/max " + str(round(slice_mem_tier0,1)) + "/" + str(round(slice_mem_tier1,1)) +\
             "\n    >{" + str(self.slicenodedata) + "}"
-        # for vm, slicevm in self.slicevmdata.items():
+        # for vm, slicevm in self.get_vmwrapper().items():
         #     txt += "\n    >{" + str(slicevm) + "}"
         return txt
\ No newline at end of file
@@ -1,20 +1,72 @@
 import numpy as np
-import sys
+import sys, os
+from model.quantilesketch import QuantileSketch
+from model.samplepyramid import SamplePyramid
+from model.rawdatastore import RawDataStore
 
 class SliceObject(object):
 
+    required_attributes = ["cpu_config","mem_config","cpu_avg","mem_avg","cpu_std","mem_std","cpu_max","mem_max",
+        "oc_page_fault","oc_page_fault_std","oc_sched_wait","oc_sched_wait_std","cpi","hwcpucycles",
+        "cpu_percentile","mem_percentile","number_of_values"]
+
+    # Percentiles stored for cpu and memory, cpi and hwcpucycles
+    usage_percentiles = list(range(10, 90, 5)) + list(range(90, 100, 1)) # percentiles from 10 to 85 then from 90 to 99
+    counter_percentiles = list(range(10, 100, 5))
+
+    # Percentiles are held in fixed-index arrays, following the order of the lists above
+    usage_percentile_index = dict(zip(usage_percentiles, range(len(usage_percentiles))))
+    counter_percentile_index = dict(zip(counter_percentiles, range(len(counter_percentiles))))
+    percentile_attributes = {"cpu_percentile": usage_percentiles, "mem_percentile": usage_percentiles, "cpi": counter_percentiles, "hwcpucycles": counter_percentiles}
+    percentile_index = {"cpu_percentile": usage_percentile_index, "mem_percentile": usage_percentile_index, "cpi": counter_percentile_index, "hwcpucycles": counter_percentile_index}
+
+    # No per instance dict, declaration order is the dump order
+    __slots__ = ("aggregation",) + tuple(required_attributes) + ("raw_data", "cpu_tier0", "cpu_tier1", "cpu_tier2", "mem_tier0", "mem_tier1", "mem_tier2", "sketches", "raw_data_key")
+    dump_excluded_attributes = ["sketches", "raw_data_key"]
+
+    # Static, statistics computed from a raw_data dict are reused when enabled (e.g. when a same trace is replayed with different parameters)
+    statistics_cache = None
+
+    # Raw metrics each statistic is computed from (memory being mem_rss on VMs), configurations are always retrieved
+    statistic_metrics = {"cpu_avg": ["cpu_usage"], "cpu_std": ["cpu_usage"], "cpu_max": ["cpu_usage"], "cpu_percentile": ["cpu_usage"],
+        "mem_avg": ["mem_usage", "mem_rss"], "mem_std": ["mem_usage", "mem_rss"], "mem_max": ["mem_usage", "mem_rss"], "mem_percentile": ["mem_usage", "mem_rss"],
+        "oc_page_fault": ["swpagefaults"], "oc_page_fault_std": ["swpagefaults"], "oc_sched_wait": ["sched_busy"], "oc_sched_wait_std": ["sched_busy"],
+        "cpi": ["cpi"], "hwcpucycles": ["hwcpucycles"]}
+    config_metrics = ["cpu", "mem"]
+
+    # Statistics a slice class needs whatever the strategy (e.g. to compare slices)
+    identity_statistics = list()
+
+    # Static, when set only these raw metrics and statistics (those read by the strategy) are fetched and computed, others being None
+    required_metrics = None
+    required_statistics = None
+
+    # Static, raw samples not read by the strategy are kept (full), dropped (summary) or spilled to the raw data store (spill)
+    # once statistics of a slice are computed
+    retention_modes = ["full", "summary", "spill"]
+    retention = "full"
+    retention_directory = None
+    raw_data_store = None
+
+    # Static, aggregation pyramids of raw metrics are kept and shared by slices of different aggregations when enabled
+    pyramid_cache = None
+
+    # Static, when set window percentiles are computed from merged quantile sketches of this relative accuracy instead of raw samples
+    sketch_accuracy = None
+
     # Can be build either by passing raw data or by passing all required attributes
     def __init__(self, **kwargs):
-        required_attributes = ["cpu_config","mem_config","cpu_percentile","mem_percentile",
-        "cpu_avg","mem_avg","cpu_std","mem_std","cpu_max","mem_max",
-        "oc_page_fault","oc_page_fault_std","oc_sched_wait","oc_sched_wait_std","cpi","hwcpucycles","number_of_values"]
         self.aggregation = kwargs["aggregation"]
+        self.raw_data_key = None
         if "raw_data" in kwargs:
             if ("compute" in kwargs) and (kwargs["compute"]): # avoid dual computation as this object is rebuilt by its childrens
-                self.compute_attributes(kwargs["raw_data"])
-            self.raw_data = kwargs["raw_data"]
+                self.compute_attributes_cached(kwargs["raw_data"])
+                self.raw_data = SliceObject.convert_raw_data(kwargs["raw_data"])
+                self.release_raw_data()
+            else:
+                self.raw_data = kwargs["raw_data"] # transient holder, converted once rebuilt by its childrens
         else:
-            for attribute in required_attributes:
+            for attribute in SliceObject.required_attributes:
                 setattr(self, attribute, kwargs[attribute])
         self.cpu_tier0 = None
         self.cpu_tier1 = None
@@ -22,62 +74,244 @@ class SliceObject(object):
         self.mem_tier0 = None
         self.mem_tier1 = None
         self.mem_tier2 = None
+        self.sketches = dict() # metric -> QuantileSketch, built on first request
 
     def aggregate(self, data_as_list : list, sum : bool = False):
-        if self.aggregation <= 1:
-            return data_as_list
-        data_aggregated = list()
-        for i in range(0, len(data_as_list), self.aggregation):
-            chunk = data_as_list[i:i+self.aggregation]
-            if sum:
-                data_aggregated.append(np.sum(chunk))
-            else:
-                data_aggregated.append(np.average(chunk))
-        if (len(chunk) < self.aggregation) and (len(data_as_list)> self.aggregation): # remove last value if uncomplete
-            data_aggregated.pop()
-        return data_aggregated
+        return SliceObject.aggregate_array(np.asarray(data_as_list, dtype=np.float64), self.aggregation, sum=sum).tolist()
+
+    @staticmethod
+    def to_array(values):
+        # Samples are kept in a contiguous array of their own numeric type, None being stored as NaN
+        array = np.asarray(values)
+        if array.dtype.kind in "iuf":
+            return array
+        try:
+            return np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            return values # non numeric list (e.g. vm list of a host)
+
+    @staticmethod
+    def to_list(values):
+        if not isinstance(values, np.ndarray):
+            return values
+        values_as_list = values.tolist()
+        if (values.dtype.kind == "f") and np.isnan(values).any(): # NaN stands for None
+            values_as_list = [None if x != x else x for x in values_as_list]
+        return values_as_list
+
+    @staticmethod
+    def convert_raw_data(raw_data : dict):
+        return {metric : SliceObject.to_array(values) for metric, values in raw_data.items()}
+
+    @staticmethod
+    def get_aggregated_length(length : int, aggregation : int):
+        return SamplePyramid.get_aggregated_length(length, aggregation)
+
+    @staticmethod
+    def aggregate_array(values : np.ndarray, aggregation : int, sum : bool = False):
+        # Chunks of aggregation values are averaged (or summed) along the last axis, through the pyramid levels dividing aggregation
+        # values may be a 1-D array or a 2-D array of rows of same length
+        return SamplePyramid(values).get_aggregated(aggregation, sum=sum)
+
+    @staticmethod
+    def get_pyramid(raw_data : dict, metric : str):
+        # Cache is keyed by object identity, the raw_data reference is kept to prevent id reuse
+        cached = SliceObject.pyramid_cache.get((id(raw_data), metric))
+        if (cached is None) or (cached[0] is not raw_data):
+            cached = (raw_data, SamplePyramid(np.asarray(raw_data[metric], dtype=np.float64)))
+            SliceObject.pyramid_cache[(id(raw_data), metric)] = cached
+        return cached[1]
+
+    @staticmethod
+    def enable_sketches(accuracy : float = 0.01):
+        QuantileSketch(accuracy) # accuracy is checked once
+        SliceObject.sketch_accuracy = accuracy
+        return SliceObject.sketch_accuracy
+
+    @staticmethod
+    def enable_retention(mode : str, directory : str = None):
+        if mode not in SliceObject.retention_modes:
+            raise ValueError("Retention must be in " + str(SliceObject.retention_modes) + ", got " + mode)
+        SliceObject.retention = mode
+        SliceObject.retention_directory = directory
+        SliceObject.raw_data_store = None # created on first spill
+        return SliceObject.retention
+
+    @staticmethod
+    def get_raw_data_store():
+        if (SliceObject.raw_data_store is None) or (SliceObject.raw_data_store.pid != os.getpid()):
+            SliceObject.raw_data_store = RawDataStore(SliceObject.retention_directory)
+        return SliceObject.raw_data_store
+
+    def release_raw_data(self):
+        # Samples of metrics the strategy does not read are released, their key being kept with a None value to preserve order
+        # Without requirements (e.g. dumps), summary retention keeps everything while spill retention still spills
+        if (SliceObject.retention == "full") or ((SliceObject.retention == "summary") and (SliceObject.required_metrics is None)):
+            return
+        retained = ["time"] + (SliceObject.required_metrics if SliceObject.required_metrics is not None else list())
+        released = {metric : values for metric, values in self.raw_data.items() if (metric not in retained) and isinstance(values, np.ndarray)}
+        if not released:
+            return
+        if SliceObject.retention == "spill":
+            self.raw_data_key = SliceObject.get_raw_data_store().put(released)
+        for metric in released.keys():
+            self.raw_data[metric] = None
+
+    def discard_raw_data(self):
+        # Spilled samples are no longer needed once the slice left the historical window
+        if self.raw_data_key is not None:
+            SliceObject.raw_data_store.discard(self.raw_data_key)
+            self.raw_data_key = None
+
+    @staticmethod
+    def enable_pyramid_cache(cache : dict = None):
+        SliceObject.pyramid_cache = cache if cache is not None else dict()
+        return SliceObject.pyramid_cache
+
+    @staticmethod
+    def enable_requirements(metrics : list, statistics : list):
+        for statistic in statistics:
+            if statistic not in SliceObject.statistic_metrics:
+                raise ValueError("Unknown slice statistic " + statistic)
+        SliceObject.required_metrics = list(metrics)
+        SliceObject.required_statistics = list(statistics)
+        return SliceObject.required_metrics, SliceObject.required_statistics
+
+    @staticmethod
+    def disable_requirements():
+        SliceObject.required_metrics = None
+        SliceObject.required_statistics = None
+
+    @staticmethod
+    def get_required_statistics(slice_class : type):
+        if SliceObject.required_statistics is None:
+            return None
+        return SliceObject.required_statistics + [statistic for statistic in slice_class.identity_statistics if statistic not in SliceObject.required_statistics]
+
+    @staticmethod
+    def get_required_metrics(slice_class : type):
+        # Fields to retrieve for slices of this class, None standing for all of them
+        statistics = SliceObject.get_required_statistics(slice_class)
+        if statistics is None:
+            return None
+        metrics = list(SliceObject.config_metrics)
+        for metric in SliceObject.required_metrics + [metric for statistic in statistics for metric in SliceObject.statistic_metrics[statistic]]:
+            if metric not in metrics:
+                metrics.append(metric)
+        return metrics
+
+    @staticmethod
+    def get_batch_required_statistics(slice_list : list):
+        required = set()
+        for slice_class in set([type(slice) for slice in slice_list]):
+            statistics = SliceObject.get_required_statistics(slice_class)
+            if statistics is None:
+                return None
+            required.update(statistics)
+        return required
+
+    @staticmethod
+    def enable_statistics_cache(cache : dict = None):
+        SliceObject.statistics_cache = cache if cache is not None else dict()
+        return SliceObject.statistics_cache
+
+    def get_statistics(self):
+        return {attribute : getattr(self, attribute) for attribute in SliceObject.required_attributes}
+
+    def set_statistics(self, statistics : dict):
+        for attribute, value in statistics.items():
+            setattr(self, attribute, value)
+
+    def compute_attributes_cached(self, raw_data : dict):
+        SliceObject.compute_attributes_cached_batch([self], [raw_data])
 
     def compute_attributes(self, raw_data : dict):
-        if "mem_rss" in raw_data:
-            memory_metric = "mem_rss" # VM case
-        else:
-            memory_metric = "mem_usage" # host case
-        # CPU/mem indicators
-        self.cpu_config = raw_data["cpu"][-1] if raw_data.get('cpu', False) else None
-        self.mem_config = raw_data["mem"][-1] if raw_data.get('mem', False) else None
-        self.cpu_avg = np.average(self.aggregate(raw_data["cpu_usage"])) if raw_data.get('cpu_usage', False) else None
-        self.mem_avg = np.average(self.aggregate(raw_data[memory_metric])) if raw_data.get(memory_metric, False) else None
-        self.cpu_std = np.std(self.aggregate(raw_data["cpu_usage"])) if raw_data.get('cpu_usage', False) else None
-        self.mem_std = np.std(self.aggregate(raw_data[memory_metric])) if raw_data.get(memory_metric, False) else None
-        self.cpu_max = np.max(self.aggregate(raw_data["cpu_usage"])) if raw_data.get('cpu_usage', False) else None
-        self.mem_max = np.max(self.aggregate(raw_data[memory_metric])) if raw_data.get(memory_metric, False) else None
+        SliceObject.compute_attributes_batch([self], [raw_data])
+
+    @staticmethod
+    def compute_slices(slice_list : list):
+        # Statistics of slices built without computation (e.g. all VMs of a host slice) are computed at once, raw data is then converted
+        SliceObject.compute_attributes_cached_batch(slice_list, [slice.raw_data for slice in slice_list])
+        for slice in slice_list:
+            slice.raw_data = SliceObject.convert_raw_data(slice.raw_data)
+            slice.release_raw_data()
+
+    @staticmethod
+    def compute_attributes_cached_batch(slice_list : list, raw_data_list : list):
+        if SliceObject.statistics_cache is None:
+            return SliceObject.compute_attributes_batch(slice_list, raw_data_list)
+        # Cache is keyed by object identity, the raw_data reference is kept to prevent id reuse
+        missing_slices, missing_raw_data = list(), list()
+        for slice, raw_data in zip(slice_list, raw_data_list):
+            cached = SliceObject.statistics_cache.get((id(raw_data), slice.aggregation))
+            if (cached is not None) and (cached[0] is raw_data):
+                slice.set_statistics(cached[1])
+            else:
+                missing_slices.append(slice)
+                missing_raw_data.append(raw_data)
+        SliceObject.compute_attributes_batch(missing_slices, missing_raw_data)
+        if SliceObject.required_statistics is not None:
+            return # partial statistics are not shared
+        for slice, raw_data in zip(missing_slices, missing_raw_data):
+            SliceObject.statistics_cache[(id(raw_data), slice.aggregation)] = (raw_data, slice.get_statistics())
+
+    @staticmethod
+    def group_samples(slice_list : list, raw_data_list : list, metric_list : list, sum : bool = False):
+        # Slices having samples of their metric are grouped by number of samples and aggregation. Samples of a group are stacked
+        # and aggregated in a 2-D array, a statistic then takes a single call per group, with the same result as on each slice
+        groups = dict()
+        for index, (slice, raw_data, metric) in enumerate(zip(slice_list, raw_data_list, metric_list)):
+            if raw_data.get(metric, False):
+                groups.setdefault((len(raw_data[metric]), slice.aggregation), list()).append(index)
+        for (length, aggregation), indexes in groups.items():
+            if SliceObject.pyramid_cache is not None: # levels of each slice are kept for other aggregations
+                aggregated = np.asarray([SliceObject.get_pyramid(raw_data_list[index], metric_list[index]).get_aggregated(aggregation, sum=sum) for index in indexes])
+            else:
+                samples = np.asarray([raw_data_list[index][metric_list[index]] for index in indexes], dtype=np.float64)
+                aggregated = SliceObject.aggregate_array(samples, aggregation, sum=sum)
+            yield [slice_list[index] for index in indexes], np.ascontiguousarray(aggregated)
+
+    @staticmethod
+    def compute_attributes_batch(slice_list : list, raw_data_list : list):
+        required = SliceObject.get_batch_required_statistics(slice_list)
+        # Statistics not required by the strategy are left to None
+        is_required = (lambda attribute : True) if (required is None) else (lambda attribute : attribute in required)
+        memory_metric_list = ["mem_rss" if "mem_rss" in raw_data else "mem_usage" for raw_data in raw_data_list] # VM case, host case
+        for slice, raw_data in zip(slice_list, raw_data_list):
+            slice.cpu_config = raw_data["cpu"][-1] if raw_data.get('cpu', False) else None
+            slice.mem_config = raw_data["mem"][-1] if raw_data.get('mem', False) else None
+            slice.number_of_values = SliceObject.get_aggregated_length(len(raw_data['time']), slice.aggregation) if 'time' in raw_data else 0
+            for attribute in ["cpu_avg", "mem_avg", "cpu_std", "mem_std", "cpu_max", "mem_max", "oc_page_fault", "oc_page_fault_std", "oc_sched_wait", "oc_sched_wait_std",
+                              "cpi", "hwcpucycles", "cpu_percentile", "mem_percentile"]:
+                setattr(slice, attribute, None) # metric without samples
+        # CPU/mem indicators, all percentiles of a metric are taken in a single call
+        for prefix, metric_list in [("cpu", ["cpu_usage"]*len(slice_list)), ("mem", memory_metric_list)]:
+            indicators = [(suffix, function) for suffix, function in [("_avg", lambda x : np.average(x, axis=-1)), ("_std", lambda x : np.std(x, axis=-1)), ("_max", lambda x : np.max(x, axis=-1)),
+                          ("_percentile", lambda x : np.percentile(x, SliceObject.usage_percentiles, axis=-1).T.copy())] if is_required(prefix + suffix)]
+            if not indicators:
+                continue
+            for group, aggregated in SliceObject.group_samples(slice_list, raw_data_list, metric_list):
+                for suffix, function in indicators:
+                    values = function(aggregated)
+                    for row, slice in enumerate(group):
+                        setattr(slice, prefix + suffix, values[row])
         # Overcommitment indicators
-        self.oc_page_fault = np.percentile(self.aggregate(raw_data['swpagefaults'],sum=True),90) if raw_data.get("swpagefaults", False) else None
-        self.oc_page_fault_std = np.std(self.aggregate(raw_data['swpagefaults'],sum=True)) if raw_data.get("swpagefaults", False) else None
-        self.oc_sched_wait = np.percentile(self.aggregate(raw_data['sched_busy']),90) if raw_data.get("sched_busy", False) else None
-        self.oc_sched_wait_std=np.std(self.aggregate(raw_data['sched_busy'])) if raw_data.get("sched_busy", False) else None
-        self.cpi = dict()
-        self.hwcpucycles = dict()
-        self.cpu_percentile = dict()
-        self.mem_percentile = dict()
-        if "cpu_usage" in raw_data and raw_data["cpu_usage"]:
-            for i in range(10, 90, 5): # percentiles from 10 to 85
-                self.cpu_percentile[i] = np.percentile(self.aggregate(raw_data['cpu_usage']),i)
-            for i in range(90, 100, 1): # percentiles from 90 to 99
-                self.cpu_percentile[i] = np.percentile(self.aggregate(raw_data['cpu_usage']),i)
-        if memory_metric in raw_data and raw_data[memory_metric]:
-            for i in range(10, 90, 5): # percentiles from 10 to 85
-                self.mem_percentile[i] = np.percentile(self.aggregate(raw_data[memory_metric]),i)
-            for i in range(90, 100, 1): # percentiles from 90 to 99
-                self.mem_percentile[i] = np.percentile(self.aggregate(raw_data[memory_metric]),i)
-        if "cpi" in raw_data:
-            for i in range(10, 100, 5):
-                self.cpi[i] = np.percentile(self.aggregate(raw_data["cpi"]),i)
-        if "hwcpucycles" in raw_data:
-            for i in range(10, 100, 5):
-                self.hwcpucycles[i] = np.percentile(self.aggregate(raw_data["hwcpucycles"]),i)
-
-        self.number_of_values = len(self.aggregate(raw_data['time'])) if 'time' in raw_data else 0
+        for attribute, metric, sum in [("oc_page_fault", "swpagefaults", True), ("oc_sched_wait", "sched_busy", False)]:
+            if not (is_required(attribute) or is_required(attribute + "_std")):
+                continue
+            for group, aggregated in SliceObject.group_samples(slice_list, raw_data_list, [metric]*len(slice_list), sum=sum):
+                percentiles, stds = np.percentile(aggregated, 90, axis=-1), np.std(aggregated, axis=-1)
+                for row, slice in enumerate(group):
+                    setattr(slice, attribute, percentiles[row])
+                    setattr(slice, attribute + "_std", stds[row])
+        # Hardware counters
+        for metric in ["cpi", "hwcpucycles"]:
+            if not is_required(metric):
+                continue
+            for group, aggregated in SliceObject.group_samples(slice_list, raw_data_list, [metric]*len(slice_list)):
+                percentiles = np.percentile(aggregated, SliceObject.counter_percentiles, axis=-1).T.copy()
+                for row, slice in enumerate(group):
+                    setattr(slice, metric, percentiles[row])
 
     def get_cpu_config(self):
         return self.cpu_config
@@ -98,11 +332,11 @@ class SliceObject(object):
         return self.mem_avg
 
     def get_percentile(self, attribute : str, percentile : int):
-        if percentile in getattr(self, attribute):
-            return getattr(self, attribute)[percentile]
-        if str(percentile) in getattr(self, attribute):    
-            return getattr(self, attribute)[str(percentile)]
-        return None
+        values = getattr(self, attribute)
+        index = SliceObject.percentile_index[attribute].get(percentile)
+        if (values is None) or (index is None):
+            return None
+        return values[index]
 
     def get_cpu_percentile(self, percentile : int):
         return self.get_percentile('cpu_percentile', percentile)
@@ -142,10 +376,32 @@ class SliceObject(object):
         return self.mem_tier0, self.mem_tier1
 
     def get_raw_metric(self, metric : str):
-        if metric in self.raw_data:
-            return self.raw_data[metric]
-        else:
-            return list()
+        if metric not in self.raw_data:
+            return np.empty(0)
+        if self.raw_data[metric] is None: # released
+            return SliceObject.raw_data_store.get(self.raw_data_key, metric) if self.raw_data_key is not None else np.empty(0)
+        return SliceObject.to_array(self.raw_data[metric])
+
+    def get_raw_metric_sketch(self, metric : str):
+        if metric not in self.sketches:
+            self.sketches[metric] = QuantileSketch.from_values(self.get_raw_metric(metric), SliceObject.sketch_accuracy)
+        return self.sketches[metric]
+
+    def get_dump_value(self, attribute : str):
+        # Arrays are converted back to the dump shape: lists of samples and dicts of percentiles
+        value = getattr(self, attribute)
+        if attribute == "raw_data":
+            return {metric : SliceObject.to_list(values if values is not None else self.get_raw_metric(metric)) for metric, values in value.items()}
+        if attribute in SliceObject.percentile_attributes:
+            return dict(zip(SliceObject.percentile_attributes[attribute], value.tolist())) if value is not None else dict()
+        return value
+
+    def get_dump_state(self):
+        # Slots are dumped from parent to child, unset ones (e.g. ratios of greedy) are skipped
+        for cls in reversed(type(self).__mro__):
+            for attribute in cls.__dict__.get("__slots__", tuple()):
+                if hasattr(self, attribute) and (attribute not in SliceObject.dump_excluded_attributes):
+                    yield attribute, self.get_dump_value(attribute)
 
     # Tiers as threshold
     def update_cpu_tiers(self, cpu_tier0, cpu_tier1):
@@ -1,9 +1,15 @@
 from model.sliceobject import SliceObject
+from model.slicebuffer import SliceBuffer
+from model.quantilesketch import QuantileSketch
 import numpy as np
 import math
+from collections import deque
 
 class SliceObjectWrapper(object):
 
+    # Static, when set window average and std are recomputed over all samples instead of merged from per slice moments (checks only)
+    exact_moments = False
+
     def __init__(self, historical_occurences : int, cpu_percentile : int, mem_percentile : int, aggregation : int):
         self.historical_occurences=historical_occurences
         self.cpu_percentile=cpu_percentile
@@ -11,7 +17,8 @@ class SliceObjectWrapper(object):
         self.aggregation=aggregation
         self.object_seen = 0
         self.object_last_seen = 0
-        self.slice_object_list=list()
+        self.slice_object_list=deque()
+        self.slice_buffers=dict() # metric -> SliceBuffer, built on first request of a metric
 
     def get_slice_object_from_raw(self, data : dict):
         # Update wrapper metrics
@@ -20,19 +27,23 @@ class SliceObjectWrapper(object):
         sliceObject = SliceObject(raw_data=data, aggregation=self.aggregation)
         return sliceObject
 
-    def get_slice_object_from_dump(self, dump_data : dict, occurence : int, epoch : int):
-        if(not dump_data["raw_data"][occurence]):
+    def get_slice_object_from_dump(self, raw_data : dict, epoch : int):
+        if(not raw_data):
             return None
         # Update wrapper metrics
         self.object_seen+=1
         self.object_last_seen = epoch
-        sliceObject = SliceObject(raw_data=dump_data["raw_data"][occurence], aggregation=self.aggregation)
+        sliceObject = SliceObject(raw_data=raw_data, aggregation=self.aggregation)
         return sliceObject
 
     def add_slice(self, slice : SliceObject):
         if self.is_historical_full():
-            self.slice_object_list.pop(0) # remove oldest element
+            self.slice_object_list.popleft().discard_raw_data() # remove oldest element
+            for buffer in self.slice_buffers.values():
+                buffer.pop_oldest()
         self.slice_object_list.append(slice)
+        for metric, buffer in self.slice_buffers.items():
+            buffer.append(slice.get_raw_metric(metric))
 
     def is_historical_full(self):
         return len(self.slice_object_list) >= self.get_historical_maxlength()
@@ -55,11 +66,44 @@ class SliceObjectWrapper(object):
                 metric_list.append(slice.get_hwcpucycles_percentile(hwcpucycles_percentile))
         return metric_list
 
+    def get_slice_buffer(self, metric : str):
+        if metric not in self.slice_buffers:
+            buffer = SliceBuffer(capacity=2*sum([len(slice.get_raw_metric(metric)) for slice in self.slice_object_list]))
+            for slice in self.slice_object_list:
+                buffer.append(slice.get_raw_metric(metric))
+            self.slice_buffers[metric] = buffer
+        return self.slice_buffers[metric]
+
     def get_slices_raw_metric(self, metric : str):
-        metric_list = list()
-        for slice in self.slice_object_list:
-            metric_list.extend(slice.get_raw_metric(metric))
-        return metric_list
+        # Read-only view on the samples of all historical slices, oldest first
+        return self.get_slice_buffer(metric).get_window()
+
+    def get_slices_raw_metric_count(self, metric : str):
+        return sum([len(slice.get_raw_metric(metric)) for slice in self.slice_object_list])
+
+    def get_slices_raw_metric_percentile(self, metric : str, percentile : int):
+        # Exact percentile over the samples of all historical slices or, when sketches are enabled, from their merged sketches
+        if SliceObject.sketch_accuracy is None:
+            return np.percentile(self.get_slices_raw_metric(metric), percentile)
+        sketches = [slice.get_raw_metric_sketch(metric) for slice in self.slice_object_list]
+        return QuantileSketch.merge_all(sketches, SliceObject.sketch_accuracy).get_quantile(percentile)
+
+    @staticmethod
+    def enable_exact_moments(enabled : bool = True):
+        SliceObjectWrapper.exact_moments = enabled
+        return SliceObjectWrapper.exact_moments
+
+    def get_slices_raw_metric_moments(self, metric : str):
+        # Average and (population) standard deviation of the samples of all historical slices, merged from per slice moments
+        if SliceObjectWrapper.exact_moments:
+            values = self.get_slices_raw_metric(metric)
+            if values.size == 0:
+                return np.nan, np.nan
+            return np.average(values), np.std(values)
+        count, mean, m2 = self.get_slice_buffer(metric).get_moments()
+        if count == 0:
+            return np.nan, np.nan
+        return mean, np.sqrt(m2/count)
 
     def get_slices_max_metric(self, metric : str = None, cpu_percentile : int = None, mem_percentile : int = None, cpi_percentile : int = None, hwcpucycles_percentile : int = None):
         max = None
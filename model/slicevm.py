@@ -2,11 +2,14 @@ from model.sliceobject import SliceObject
 
 class SliceVm(SliceObject):
 
-    def __init__(self, slice_object : SliceObject):
-        # Retrieve parent attribute for computation
-        slice_attributes = slice_object.__dict__
-        slice_attributes["compute"] = True
-        super().__init__(**slice_attributes)
+    __slots__ = ("cpu_state", "mem_state")
+
+    # Compared to detect a VM which ended (see __eq__)
+    identity_statistics = ["cpu_avg", "cpu_std", "mem_avg", "oc_page_fault", "oc_sched_wait"]
+
+    def __init__(self, slice_object : SliceObject, compute : bool = True):
+        # Retrieve parent raw data for computation, unless deferred to SliceObject.compute_slices
+        super().__init__(raw_data=slice_object.raw_data, aggregation=slice_object.aggregation, compute=compute)
         # Specific attributes
         self.cpu_state = 0
         self.mem_state = 0
@@ -51,7 +54,7 @@ class SliceVm(SliceObject):
         return True
 
     def dump_state_to_dict(self, dump_dict : dict, iteration : int = 0):
-        for attribute, value in self.__dict__.items():
+        for attribute, value in self.get_dump_state():
             if attribute not in dump_dict:
                 if attribute in ["raw_data", "cpu_percentile", "mem_percentile", "cpi", "hwcpucycles"]:
                     dump_dict[attribute] = [dict() for x in range(iteration)] # in case of a new VM
@@ -1,42 +1,108 @@
 from model.sliceobjectwrapper import SliceObjectWrapper
 from model.sliceobject import SliceObject
 from model.slicevm import SliceVm
-from scipy.stats import ttest_ind_from_stats
+from model.vmregistry import VmRegistry
 
 class SliceVmWrapper(SliceObjectWrapper):
 
-    def __init__(self, domain_name : str, historical_occurences : int, cpu_percentile : int, mem_percentile : int, aggregation : int):
-        super().__init__(historical_occurences, cpu_percentile, mem_percentile, aggregation)
-        self.domain_name=domain_name
-        self.debug_cpu_reason = "=0 no prev data"
-        self.debug_mem_reason = "=0 no prev data"
+    debug_cpu_reason = "=0 no prev data"
+    debug_mem_reason = "=0 no prev data"
+
+    # View on the history of a VM at a slice position, built on demand: wrapper attributes are read from and written to the registry
+    def __init__(self, registry : VmRegistry, domain_name : str, position : int):
+        self.registry = registry
+        self.position = position
+        self.history = registry.register(domain_name, position)
+
+    @property
+    def domain_name(self):
+        return self.history.domain_name
+
+    @property
+    def historical_occurences(self):
+        return self.registry.historical_occurences
+
+    @property
+    def cpu_percentile(self):
+        return self.registry.cpu_percentile
+
+    @property
+    def mem_percentile(self):
+        return self.registry.mem_percentile
+
+    @property
+    def aggregation(self):
+        return self.registry.aggregation
+
+    @property
+    def slice_object_list(self):
+        return self.history.slice_lists[self.position]
+
+    @property
+    def slice_buffers(self):
+        return self.history.slice_buffers[self.position]
+
+    @property
+    def object_seen(self):
+        return self.history.object_seen[self.position]
+
+    @object_seen.setter
+    def object_seen(self, object_seen : int):
+        self.history.object_seen[self.position] = object_seen
+
+    @property
+    def object_last_seen(self):
+        return self.history.object_last_seen[self.position]
+
+    @object_last_seen.setter
+    def object_last_seen(self, object_last_seen : int):
+        self.history.object_last_seen[self.position] = object_last_seen
+
+    @property
+    def is_ended(self):
+        return self.history.ended[self.position]
+
+    @is_ended.setter
+    def is_ended(self, is_ended : bool):
+        self.history.ended[self.position] = is_ended
 
     def add_slice_data_from_raw(self, domain_data : dict):
+        slice_vm = self.get_slice_vm_from_raw(domain_data)
+        if slice_vm is not None:
+            self.add_computed_slice_from_raw(slice_vm)
+
+    def get_slice_vm_from_raw(self, domain_data : dict, compute : bool = True):
         if(len(domain_data.keys()) == 0):
             print("Empty data on slice encountered on domain " + self.domain_name)
-            return
-        slice_vm = SliceVm(self.get_slice_object_from_raw(domain_data))
+            return None
+        return SliceVm(self.get_slice_object_from_raw(domain_data), compute=compute)
+
+    def add_computed_slice_from_raw(self, slice_vm : SliceVm):
         self.compute_state_of_new_slice(slice_vm)
         self.add_slice(slice_vm)
 
-    def add_slice_data_from_dump(self, vm_dump_data : dict, occurence : int, epoch : int):
-        if(len(vm_dump_data.keys()) == 0):
-            print("Empty data on slice encountered on dump " + self.domain_name)
-            return
-        slice_object = self.get_slice_object_from_dump(dump_data=vm_dump_data, occurence=occurence, epoch=epoch)
-        if slice_object == None:
+    def add_slice_data_from_dump(self, vm_raw_data : dict, epoch : int):
+        slice_vm = self.get_slice_vm_from_dump(vm_raw_data, epoch=epoch)
+        if slice_vm is None:
             return False # VM not started yet
-        slice_vm = SliceVm(slice_object)
+        return self.add_computed_slice_from_dump(slice_vm)
+
+    def get_slice_vm_from_dump(self, vm_raw_data : dict, epoch : int, compute : bool = True):
+        slice_object = self.get_slice_object_from_dump(raw_data=vm_raw_data, epoch=epoch)
+        if slice_object == None:
+            return None # VM not started yet
+        return SliceVm(slice_object, compute=compute)
+
+    def add_computed_slice_from_dump(self, slice_vm : SliceVm):
         if slice_vm == self.get_last_slice():
             self.is_ended = True
+            slice_vm.discard_raw_data() # not kept
             return False
         self.add_slice(slice_vm)
         return True
 
     def is_vm_ended(self):
-        if hasattr(self, 'is_ended'):
-            return self.is_ended
-        return False
+        return self.is_ended
 
     def get_cpu_mem_tiers(self):
         return 0,0,0,0 # Unused for the current paper. TODO: clean up
@@ -0,0 +1,37 @@
+import numpy as np
+from model.sliceobject import SliceObject
+from model.stability_assesser.stabilityassesserforecast import StabilityAssesserForecast
+
+class StabilityAssesserAr(StabilityAssesserForecast):
+
+    # NumPy only counterpart of StabilityAssesserLstm: an autoregressive model of order look_back (with intercept) is fitted
+    # by least squares on the historical window instead of training an LSTM, the same train vs projection RMSE gap being tested
+    def __init__(self, look_back : int = 1, threshold : float = 0.01):
+        super().__init__()
+        self.look_back = look_back
+        self.threshold = threshold
+
+    def assess_form_slice_list(self, slice_list : list, new_slice : SliceObject, metric : str, max_config : int, model_key : tuple = None):
+        current_data, new_data = self.get_slice_list_data(slice_list, new_slice, metric)
+        traindata = self.transform_list_of_dict(current_data, metric, max_config)
+        projectiondata_time, projectiondata_metrics = self.transform_dict(new_data, metric, max_config)
+
+        dataset = np.array(traindata[metric] + projectiondata_metrics)[..., np.newaxis] # for plotting purpose only
+        trainX, trainY = self.create_dataset(np.array(traindata[metric])[..., np.newaxis], self.look_back)
+        projectionX, projectionY = self.create_dataset(np.array(projectiondata_metrics)[..., np.newaxis], self.look_back)
+        trainX, projectionX = trainX.reshape(len(trainX), self.look_back), projectionX.reshape(len(projectionX), self.look_back)
+
+        coefficients = self.fit(trainX, trainY)
+        return self.get_verdict(dataset=dataset, look_back=self.look_back, trainY=trainY, trainPredict=self.predict(trainX, coefficients)[..., np.newaxis],
+                                projectionY=projectionY, projectionPredict=self.predict(projectionX, coefficients)[..., np.newaxis],
+                                metric=metric, max_value_config=max_config, threshold=self.threshold, input_old=current_data, input_new=new_data)
+
+    def fit(self, trainX : np.ndarray, trainY : np.ndarray):
+        if len(trainX) == 0:
+            return np.zeros(self.look_back + 1)
+        design = np.hstack([trainX, np.ones((len(trainX), 1))])
+        coefficients, residuals, rank, singular_values = np.linalg.lstsq(design, trainY, rcond=None)
+        return coefficients
+
+    def predict(self, x : np.ndarray, coefficients : np.ndarray):
+        return x @ coefficients[:-1] + coefficients[-1]
@@ -0,0 +1,136 @@
+import numpy as np
+import os
+import json
+from model.sliceobject import SliceObject
+from model.stability_assesser.stabilitycache import StabilityCache
+
+class StabilityAssesserForecast(object):
+
+    # Common part of assessers fitting a predictor on the historical window: a slice is stable when the prediction error (RMSE)
+    # on the projected slice is close to the one on the window. Heavy backends (TensorFlow) are only imported by subclasses
+    instance_count = 1  # Static, shared by all backends: ids of dump-lstm.csv rows
+    # Static, warm started models keyed by (host name, slice position, metric), None when every assessment trains a model from scratch
+    models = None
+    training_limit = None # most recent samples a model is trained on, all of them if None
+    cache = None # Static, on-disk verdicts of models trained from scratch (StabilityCache), None to always train
+
+    def __init__(self):
+        self.id = StabilityAssesserForecast.instance_count
+        StabilityAssesserForecast.instance_count+=1
+
+    @staticmethod
+    def enable_warm_start(training_limit : int = None):
+        if (training_limit is not None) and (training_limit <= 0):
+            raise ValueError("Training limit must be a positive number of samples")
+        StabilityAssesserForecast.models = dict()
+        StabilityAssesserForecast.training_limit = training_limit
+
+    @staticmethod
+    def enable_cache(location : str, max_size : int = 256*1024*1024):
+        StabilityAssesserForecast.cache = StabilityCache(location, max_size)
+        return StabilityAssesserForecast.cache
+
+    @staticmethod
+    def reset_models():
+        # Models of a previous replay must not be fine-tuned by the next one
+        if StabilityAssesserForecast.models is not None:
+            StabilityAssesserForecast.models = dict()
+
+    def get_slice_list_data(self, slice_list : list, new_slice : SliceObject, metric : str):
+        current_data = list()
+        for slice in slice_list:
+            x = dict()
+            x["time"] = SliceObject.to_list(slice.get_raw_metric("time"))
+            x[metric] = SliceObject.to_list(slice.get_raw_metric(metric))
+            current_data.append(x)
+
+        new_data = dict()
+        new_data["time"] = SliceObject.to_list(new_slice.get_raw_metric("time"))
+        new_data[metric] = SliceObject.to_list(new_slice.get_raw_metric(metric))
+        return current_data, new_data
+
+    def transform_list_of_dict(self, traindata_as_list : dict, metric : str, max_value_config : int):
+        traindata = dict()
+        traindata["time"] = list()
+        traindata[metric] = list()
+        for slicedata in traindata_as_list:
+            time, metrics = self.transform_dict(slicedata, metric, max_value_config)
+            traindata["time"].extend(time)
+            traindata[metric].extend(metrics)
+        return traindata
+
+    def transform_dict(self, slicedata : dict, metric : str, max_value_config):
+        return slicedata["time"], [round(x/max_value_config,3) for x in slicedata[metric]]
+
+    def inverse_transform_x(self,  array : np.array, max_value_config : int):
+        reverse_array = [round(x[0]*max_value_config,1) for x in array]
+        return np.array(reverse_array)[..., np.newaxis]
+
+    def inverse_transform_y(self,  array : np.array, max_value_config : int):
+        reverse_array = [round(x*max_value_config,1) for x in array]
+        return np.array([reverse_array])
+
+    # convert an array of values into a dataset matrix
+    def create_dataset(self, dataset, look_back=1):
+        dataX, dataY = [], []
+        for i in range(len(dataset)-look_back-1):
+            a = dataset[i:(i+look_back), 0]
+            dataX.append(a)
+            dataY.append(dataset[i + look_back, 0])
+        return np.array(dataX), np.array(dataY)
+
+    @staticmethod
+    def get_rmse(expected : np.ndarray, predicted : np.ndarray):
+        if expected.size == 0:
+            return np.nan # no sample, never considered stable
+        return np.sqrt(np.mean(np.square(expected - predicted)))
+
+    def get_verdict(self, dataset : np.ndarray, look_back : int, trainY : np.ndarray, trainPredict : np.ndarray, projectionY : np.ndarray, projectionPredict : np.ndarray,
+                    metric : str, max_value_config : int, threshold : float, input_old : list, input_new : dict):
+        # Normalized predictions (one per row) and targets are scaled back to the configuration before errors are compared
+        trainPredict = self.inverse_transform_x(trainPredict, max_value_config)
+        projectionPredict = self.inverse_transform_x(projectionPredict, max_value_config)
+        trainScore = StabilityAssesserForecast.get_rmse(self.inverse_transform_y(trainY, max_value_config)[0], trainPredict[:,0])
+        projectionScore = StabilityAssesserForecast.get_rmse(self.inverse_transform_y(projectionY, max_value_config)[0], projectionPredict[:,0])
+        abs_gap = np.abs(trainScore - projectionScore)
+        threshold_val = max_value_config*threshold
+        self.dump_debug(dataset=dataset, look_back=look_back, trainPredict=trainPredict, projectionPredict=projectionPredict,
+                        metric=metric, max_value_config=max_value_config, trainScore=trainScore, projectionScore=projectionScore,
+                        input_old=input_old, input_new=input_new, abs_gap=abs_gap, threshold=threshold_val)
+        return bool(abs_gap < threshold_val)
+
+    def dump_debug(self, dataset : np.ndarray, look_back : int, trainPredict : np.ndarray, projectionPredict : np.ndarray,
+                metric : str, max_value_config : int, trainScore : float, projectionScore : float, abs_gap : float, threshold : float,
+                input_old : list, input_new : dict):
+
+        dump_lstm_file_location = 'dump-lstm.csv'
+        if os.path.isfile(dump_lstm_file_location):
+            trainPredictPlot = np.empty_like(dataset)
+            trainPredictPlot[:, :] = np.nan
+            trainPredictPlot[look_back:len(trainPredict)+look_back, :] = trainPredict
+            # shift test predictions for plotting
+            projectionPredictPlot = np.empty_like(dataset)
+            projectionPredictPlot[:, :] = np.nan
+            projectionPredictPlot[len(trainPredict)+(look_back*2)+1:len(dataset)-1, :] = projectionPredict
+            # plot baseline and predictions
+            np_inverse = self.inverse_transform_x(dataset, max_value_config)
+            # header = 'iteration,metric,config,trainscore,projectionscore,gap,threshold,realdata,predictold,predictnew'
+            separator = '\t'
+            with open(dump_lstm_file_location,'a') as fd:
+                fd.write(
+                    str(self.id) + separator +\
+                    str(metric) + separator +\
+                    str(max_value_config) + separator +\
+                    str(trainScore) + separator +\
+                    str(projectionScore) + separator +\
+                    str(abs_gap) + separator +\
+                    str(threshold) + separator +\
+                    self.convert_to_hex( ''.join(str(x) for x in np_inverse)) + separator +\
+                    self.convert_to_hex( ''.join(str(x) for x in trainPredictPlot)) + separator +\
+                    self.convert_to_hex( ''.join(str(x) for x in projectionPredictPlot)) + separator +\
+                    self.convert_to_hex(json.dumps(input_old)) + separator +\
+                    self.convert_to_hex(json.dumps(input_new)) +'\n'
+                )
+
+    def convert_to_hex(self, string : str):
+        return string.encode("utf-8").hex()
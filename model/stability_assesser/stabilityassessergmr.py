@@ -1,13 +1,4 @@
-import pandas as pd
-from pandas import concat
-from sklearn.metrics import mean_absolute_error
-from numpy import asarray
-from sklearn.ensemble import RandomForestRegressor
-from matplotlib import pyplot
 import numpy as np
-import matplotlib.pyplot as plt
-from gmr.utils import check_random_state
-from gmr import MVN, GMM, plot_error_ellipses
 
 class StabilityAssesserGmr(object):
 
@@ -33,6 +24,9 @@ class StabilityAssesserGmr(object):
         return np.array([time, metrics]).transpose()
 
     def assess(self, traindata : list, targetdata : dict, metric : str):
+        import matplotlib.pyplot as plt # gmr and matplotlib, only loaded when assessing
+        from gmr.utils import check_random_state
+        from gmr import GMM, plot_error_ellipses
 
         X = self.get_formatted_nparray_from_list(traindata, metric)
         X_test = self.get_formatted_nparray_from_dict(targetdata, metric)
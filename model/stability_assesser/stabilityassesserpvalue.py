@@ -1,6 +1,5 @@
 from model.sliceobject import SliceObject
 import numpy as np
-from scipy.stats import ttest_ind_from_stats
 
 class StabilityAssesserPValue(object):
 
@@ -12,6 +11,7 @@ class StabilityAssesserPValue(object):
 
     # https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.ttest_ind_from_stats.html
     def assess(self, old_data : list, new_data : list, threshold : int = 0.1):
+        from scipy.stats import ttest_ind_from_stats # scipy.stats alone takes longer to import than the whole model
         old_average = np.average(old_data)
         old_std = np.std(old_data)
         new_average =  np.average(new_data)
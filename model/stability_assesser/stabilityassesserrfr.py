@@ -1,9 +1,6 @@
 import pandas as pd
 from pandas import concat
-from sklearn.metrics import mean_absolute_error
 from numpy import asarray
-from sklearn.ensemble import RandomForestRegressor
-from matplotlib import pyplot
 import numpy as np
 
 class StabilityAssesserRfr(object):
@@ -52,6 +49,7 @@ class StabilityAssesserRfr(object):
         
     # walk-forward validation for univariate data
     def walk_forward_validation(self, traindata):
+        from sklearn.metrics import mean_absolute_error # sklearn, only loaded when assessing
         predictions = list()
         # split dataset
         n_test = int(len(traindata)*0.10)
@@ -79,6 +77,7 @@ class StabilityAssesserRfr(object):
 
     # fit an random forest model
     def build_and_fit_model(self, train):
+        from sklearn.ensemble import RandomForestRegressor
         train = asarray(train)
         # split into input and output columns
         trainX, trainy = self.split(train)
@@ -99,6 +98,7 @@ class StabilityAssesserRfr(object):
 
     # fit an random forest model and make a multi step prediction
     def try_mode(self, traindata, n_test):
+        from sklearn.metrics import mean_absolute_error
         predictions = list()
         # split dataset
         train, test = self.train_test_split(traindata, n_test)
@@ -128,6 +128,7 @@ class StabilityAssesserRfr(object):
         return traindata
 
     def assess(self, traindata_as_list : list, targetdata : dict, metric : str):
+        from matplotlib import pyplot
         
         traindata = self.format_data(traindata_as_list, metric)
 
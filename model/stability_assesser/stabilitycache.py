@@ -0,0 +1,74 @@
+import sqlite3, hashlib, json, os, time
+import numpy as np
+
+class StabilityCache(object):
+
+    # On-disk store of stability verdicts, keyed by a hash of everything a verdict depends on: windows, metric, configuration,
+    # threshold and model hyperparameters. Replays of a seen trace (other strategies, percentiles) read verdicts back instead of training
+    # Predictions are kept along scores so that dump-lstm.csv rows are the same on a hit. Least recently used entries are evicted
+    # once entries exceed max_size bytes. Workers of a replay pool share the file, each process opening its own connection
+    def __init__(self, location : str, max_size : int = 256*1024*1024):
+        if max_size <= 0:
+            raise ValueError("Stability cache size must be a positive number of bytes")
+        self.location = location
+        self.max_size = max_size
+        self.connection = None
+        self.pid = None
+        self.get_connection() # an unusable location is reported before the replay
+
+    def get_connection(self):
+        if self.pid != os.getpid(): # connection of a parent process is not used by forked workers
+            self.connection = sqlite3.connect(self.location, timeout=60, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, train_score REAL, projection_score REAL, verdict INTEGER, " +
+                                    "train_predict BLOB, projection_predict BLOB, size INTEGER, last_used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+            self.pid = os.getpid()
+        return self.connection
+
+    @staticmethod
+    def get_key(train_data : list, projection_data : list, metric : str, max_config : int, threshold : float, hyperparameters : dict):
+        content = json.dumps([train_data, projection_data, metric, max_config, threshold, hyperparameters], separators=(',', ':'), sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def to_score(value):
+        return np.float64(np.nan if value is None else value) # NaN is stored as NULL by sqlite
+
+    def get(self, key : str):
+        connection = self.get_connection()
+        row = connection.execute("SELECT train_score, projection_score, verdict, train_predict, projection_predict FROM verdicts WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE verdicts SET last_used=? WHERE key=?", (time.time(), key))
+        train_score, projection_score, verdict, train_predict, projection_predict = row
+        return {"train_score": StabilityCache.to_score(train_score), "projection_score": StabilityCache.to_score(projection_score), "verdict": bool(verdict),
+                "train_predict": np.frombuffer(train_predict, dtype=np.float64)[..., np.newaxis],
+                "projection_predict": np.frombuffer(projection_predict, dtype=np.float64)[..., np.newaxis]}
+
+    def put(self, key : str, train_score : float, projection_score : float, verdict : bool, train_predict : np.ndarray, projection_predict : np.ndarray):
+        # Predictions are single column arrays, as scaled back by StabilityAssesserForecast.inverse_transform_x
+        train_predict = np.ascontiguousarray(train_predict, dtype=np.float64).tobytes()
+        projection_predict = np.ascontiguousarray(projection_predict, dtype=np.float64).tobytes()
+        size = len(key) + len(train_predict) + len(projection_predict) + 40 # scores, verdict and timestamp
+        connection = self.get_connection()
+        connection.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (key, float(train_score), float(projection_score), int(verdict), train_predict, projection_predict, size, time.time()))
+        self.evict()
+
+    def evict(self):
+        connection = self.get_connection()
+        excess = connection.execute("SELECT COALESCE(SUM(size), 0) FROM verdicts").fetchone()[0] - self.max_size
+        if excess <= 0:
+            return 0
+        evicted = list()
+        for key, size in connection.execute("SELECT key, size FROM verdicts ORDER BY last_used"):
+            evicted.append((key,))
+            excess-=size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM verdicts WHERE key=?", evicted)
+        return len(evicted)
+
+    def get_entry_count(self):
+        return self.get_connection().execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
@@ -0,0 +1,131 @@
+import numpy as np
+import os
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+import tensorflow as tf
+from model.sliceobject import SliceObject
+from model.stability_assesser.stabilityassesserforecast import StabilityAssesserForecast
+
+class StabilityService(object):
+
+    # Stability assessments of a slice boundary (every host, CPU and memory) are queued, then resolved by a single training
+    # Each series keeps its own weights of the LSTM(4) -> Dense(1) network of StabilityAssesserLstm, stacked on a first axis
+    # and trained at once by a compiled loop: TensorFlow dispatch is paid once per boundary instead of once per series and call
+    # As in StabilityAssesserLstm, every series starts from the same seeded weights and is fed one sample per step (batch_size=1)
+    # With a single time step and a zero initial state, the recurrent kernel of the LSTM never contributes and is left out
+    def __init__(self, units : int = 4, epochs : int = 3, learning_rate : float = 0.001, threshold : float = 0.01, seed : int = 2):
+        self.units = units
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.threshold = threshold
+        self.seed = seed
+        self.pending = list() # (assesser, [cpu series, mem series], on_verdict)
+        self.resolved_hooks = list() # called once verdicts are set, in submission order
+        self.initial_weights = self.get_initial_weights()
+        series_spec = tf.TensorSpec([None, None], tf.float32)
+        self.fit = tf.function(self.fit_series, input_signature=[series_spec, series_spec, series_spec, series_spec])
+        self.predict = tf.function(self.forward, input_signature=[series_spec, series_spec])
+
+    def get_initial_weights(self):
+        # Keras defaults: glorot uniform kernels, zero biases but the forget gate one (unit_forget_bias)
+        rng = np.random.default_rng(self.seed)
+        units = self.units
+        kernel = rng.uniform(-np.sqrt(6/(1+4*units)), np.sqrt(6/(1+4*units)), 4*units)
+        bias = np.zeros(4*units)
+        bias[units:2*units] = 1
+        dense = rng.uniform(-np.sqrt(6/(units+1)), np.sqrt(6/(units+1)), units)
+        return np.concatenate([kernel, bias, dense, [0]]).astype(np.float32)
+
+    def forward(self, x, weights):
+        # x: (series, samples) of look_back 1, weights: (series, 9*units+1)
+        units = self.units
+        kernel, bias = weights[:, None, :4*units], weights[:, None, 4*units:8*units]
+        dense, dense_bias = weights[:, None, 8*units:9*units], weights[:, 9*units:]
+        input_gate, forget_gate, cell_gate, output_gate = tf.split(x[..., None]*kernel + bias, 4, axis=-1)
+        cell = tf.sigmoid(input_gate)*tf.tanh(cell_gate)
+        hidden = tf.sigmoid(output_gate)*tf.tanh(cell)
+        return tf.reduce_sum(hidden*dense, axis=-1) + dense_bias
+
+    def fit_series(self, x, y, mask, weights):
+        # One Adam step (Keras defaults) per column, series whose samples are exhausted being masked out
+        beta_1, beta_2, epsilon = 0.9, 0.999, 1e-7
+        moment, velocity = tf.zeros_like(weights), tf.zeros_like(weights)
+        iterations = tf.zeros_like(weights[:, :1])
+        for step in tf.range(tf.shape(x)[1]):
+            step_mask = mask[:, step:step+1]
+            with tf.GradientTape() as tape:
+                tape.watch(weights)
+                loss = tf.reduce_sum(step_mask*tf.square(self.forward(x[:, step:step+1], weights) - y[:, step:step+1]))
+            gradient = tape.gradient(loss, weights)
+            iterations = iterations + step_mask
+            local_step = tf.maximum(iterations, 1)
+            alpha = self.learning_rate*tf.sqrt(1 - tf.pow(beta_2, local_step))/(1 - tf.pow(beta_1, local_step))
+            updated_moment = moment + (gradient - moment)*(1 - beta_1)
+            updated_velocity = velocity + (tf.square(gradient) - velocity)*(1 - beta_2)
+            updated = step_mask > 0
+            weights = tf.where(updated, weights - updated_moment*alpha/(tf.sqrt(updated_velocity) + epsilon), weights)
+            moment = tf.where(updated, updated_moment, moment)
+            velocity = tf.where(updated, updated_velocity, velocity)
+        return weights
+
+    def submit(self, slice_list : list, new_slice : SliceObject, on_verdict):
+        # Raw data are read at once, slices of the window may leave it before the boundary is resolved
+        assesser = StabilityAssesserForecast()
+        series = list()
+        for metric, max_config in [('cpu_usage', new_slice.get_cpu_config()), ('mem_usage', new_slice.get_mem_config())]:
+            current_data, new_data = assesser.get_slice_list_data(slice_list, new_slice, metric)
+            series.append(self.get_series(assesser, current_data, new_data, metric, max_config))
+        self.pending.append((assesser, series, on_verdict))
+
+    def add_resolved_hook(self, hook):
+        self.resolved_hooks.append(hook)
+
+    def get_series(self, assesser : StabilityAssesserForecast, current_data : list, new_data : dict, metric : str, max_config : int):
+        traindata = assesser.transform_list_of_dict(current_data, metric, max_config)
+        projectiondata_time, projectiondata_metrics = assesser.transform_dict(new_data, metric, max_config)
+        trainX, trainY = assesser.create_dataset(np.array(traindata[metric])[..., np.newaxis], look_back=1)
+        projectionX, projectionY = assesser.create_dataset(np.array(projectiondata_metrics)[..., np.newaxis], look_back=1)
+        return {"metric": metric, "max_config": max_config, "current_data": current_data, "new_data": new_data,
+                "dataset": np.array(traindata[metric] + projectiondata_metrics)[..., np.newaxis],
+                "trainX": trainX.reshape(-1), "trainY": trainY, "projectionX": projectionX.reshape(-1), "projectionY": projectionY}
+
+    @staticmethod
+    def get_padded(arrays : list):
+        padded = np.zeros((len(arrays), max([1] + [len(array) for array in arrays])), dtype=np.float32)
+        for index, array in enumerate(arrays):
+            padded[index, :len(array)] = array
+        return padded
+
+    def get_schedule(self, series : list):
+        # Samples fed at each step: a seeded shuffle per epoch, as Keras fit(shuffle=True), same for every series
+        sizes = [len(serie["trainX"]) for serie in series]
+        orders = list()
+        for size in sizes:
+            rng = np.random.default_rng(self.seed)
+            orders.append(np.concatenate([rng.permutation(size) for epoch in range(self.epochs)]))
+        x = StabilityService.get_padded([serie["trainX"][order] for serie, order in zip(series, orders)])
+        y = StabilityService.get_padded([serie["trainY"][order] for serie, order in zip(series, orders)])
+        mask = StabilityService.get_padded([np.ones(len(order)) for order in orders])
+        return x, y, mask
+
+    def flush(self):
+        pending, hooks = self.pending, self.resolved_hooks
+        self.pending, self.resolved_hooks = list(), list()
+        if pending:
+            series = [serie for assesser, pending_series, on_verdict in pending for serie in pending_series]
+            x, y, mask = self.get_schedule(series)
+            weights = self.fit(x, y, mask, np.tile(self.initial_weights, (len(series), 1)))
+            train_predict = self.predict(StabilityService.get_padded([serie["trainX"] for serie in series]), weights).numpy()
+            projection_predict = self.predict(StabilityService.get_padded([serie["projectionX"] for serie in series]), weights).numpy()
+            index = 0
+            for assesser, pending_series, on_verdict in pending:
+                verdicts = list()
+                for serie in pending_series:
+                    verdicts.append(assesser.get_verdict(dataset=serie["dataset"], look_back=1, trainY=serie["trainY"], trainPredict=train_predict[index, :len(serie["trainX"]), np.newaxis],
+                                    projectionY=serie["projectionY"], projectionPredict=projection_predict[index, :len(serie["projectionX"]), np.newaxis],
+                                    metric=serie["metric"], max_value_config=serie["max_config"], threshold=self.threshold,
+                                    input_old=serie["current_data"], input_new=serie["new_data"]))
+                    index+=1
+                on_verdict(*verdicts)
+        for hook in hooks:
+            hook()
+        return len(pending)
@@ -0,0 +1,49 @@
+from collections import deque
+
+class VmHistory(object):
+
+    # History of a VM at every slice position of its node, positions where the VM was not seen yet hold None
+    __slots__ = ("domain_name", "slice_lists", "slice_buffers", "object_seen", "object_last_seen", "ended")
+
+    def __init__(self, domain_name : str, number_of_slice : int):
+        self.domain_name = domain_name
+        self.slice_lists = [None]*number_of_slice
+        self.slice_buffers = [None]*number_of_slice
+        self.object_seen = [0]*number_of_slice
+        self.object_last_seen = [0]*number_of_slice
+        self.ended = [False]*number_of_slice
+
+    def open_position(self, position : int):
+        if self.slice_lists[position] is not None:
+            return False
+        self.slice_lists[position] = deque()
+        self.slice_buffers[position] = dict() # metric -> SliceBuffer, built on first request of a metric
+        return True
+
+class VmRegistry(object):
+
+    # VM histories of a node, shared by its slice models: a single entry per VM, indexed by slice position
+    # Slice models read them through SliceVmWrapper views instead of owning a wrapper per VM
+    def __init__(self, number_of_slice : int, historical_occurences : int, cpu_percentile : int, mem_percentile : int, aggregation : int):
+        self.number_of_slice = number_of_slice
+        self.historical_occurences = historical_occurences
+        self.cpu_percentile = cpu_percentile
+        self.mem_percentile = mem_percentile
+        self.aggregation = aggregation
+        self.histories = dict() # domain name -> VmHistory
+        self.position_domains = [list() for position in range(number_of_slice)] # domain names in order of appearance on each position
+
+    def register(self, domain_name : str, position : int):
+        history = self.histories.get(domain_name, None)
+        if history is None:
+            history = VmHistory(domain_name, self.number_of_slice)
+            self.histories[domain_name] = history
+        if history.open_position(position):
+            self.position_domains[position].append(domain_name)
+        return history
+
+    def get_history(self, domain_name : str):
+        return self.histories.get(domain_name, None)
+
+    def get_domains(self, position : int):
+        return self.position_domains[position]
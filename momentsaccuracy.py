@@ -0,0 +1,150 @@
+import os, sys, getopt, contextlib
+import numpy as np
+from scroogevm import main_loop_from_dump
+from model.slicebuffer import SliceBuffer
+from model.sliceobjectwrapper import SliceObjectWrapper
+from model.slicehostwrapper import SliceHostWrapper
+from model.dumpreader import open_dump
+
+# Tiers of strategies reading window average and std from merged moments, and resulting free resources
+REPORT_METRICS = ["cpu_tier0", "cpu_tier1", "mem_tier0", "mem_tier1", "free_cpu", "free_mem"]
+
+def get_relative_error(expected : float, computed : float):
+    if np.isnan(expected) or np.isnan(computed):
+        return 0.0 if (np.isnan(expected) and np.isnan(computed)) else np.inf
+    scale = max(abs(expected), abs(computed))
+    return abs(computed - expected)/scale if scale > 0 else 0.0
+
+def get_synthetic_series(seed : int = 0):
+    # Slices of uneven sample counts (empty, single sample, not a multiple of the aggregation), at CPU and memory scales
+    rng = np.random.default_rng(seed)
+    counts = [1, 7, 90, 0, 13, 89, 91, 0, 0, 2, 30, 1]
+    cpu = [rng.uniform(0, 64, count) for count in counts]
+    mem = [1e5 + rng.normal(0, 50, count) for count in counts]
+    return {"synthetic cpu": cpu, "synthetic mem": mem}
+
+def get_dump_series(dump_to_load):
+    # Raw samples of the node and of every VM, per slice position, VM slices holding NaN samples being left out
+    config = dump_to_load.get_config()
+    number_of_slice = int(config["node_scope"]/config["slice_scope"])
+    series = dict()
+    for occurence in range(dump_to_load.get_occurence_count()):
+        data = dump_to_load.get_occurence(occurence)
+        position = occurence % number_of_slice
+        sources = [("node", data["node"], ["cpu_usage", "mem_usage"])] + [(vm, vm_data, ["cpu_usage", "mem_rss"]) for vm, vm_data in data["vm"].items()]
+        for name, raw_data, metrics in sources:
+            for metric in metrics:
+                values = np.asarray(raw_data.get(metric, list()), dtype=np.float64)
+                if np.isnan(values).any():
+                    continue
+                series.setdefault(name + " " + metric + " position " + str(position), list()).append(values)
+    return series
+
+def check_windows(slices : list, window : int, tolerance : float):
+    # Slices go through a SliceBuffer as in a wrapper: merged moments of every sliding window are compared with the full recomputation
+    buffer = SliceBuffer()
+    max_error = 0.0
+    failures = 0
+    for index, values in enumerate(slices):
+        buffer.append(values)
+        if len(buffer.lengths) > window:
+            buffer.pop_oldest()
+        samples = np.concatenate(slices[max(0, index-window+1):index+1])
+        count, mean, m2 = buffer.get_moments()
+        if count != samples.size:
+            failures+=1
+            continue
+        if count == 0:
+            continue
+        errors = [get_relative_error(np.average(samples), mean), get_relative_error(np.std(samples), np.sqrt(m2/count))]
+        max_error = max([max_error] + errors)
+        failures+=sum([error > tolerance for error in errors])
+    return max_error, failures
+
+def replay(dump_to_load, strategy : str, aggregation : int, exact : bool):
+    SliceObjectWrapper.enable_exact_moments(exact)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        dump_state = main_loop_from_dump(dump_to_load, debug=1, aggregation=aggregation, strategy=strategy, save=False)
+    SliceObjectWrapper.enable_exact_moments(False)
+    return dump_state
+
+def check_replays(dump_to_load, strategy : str, aggregation : int, tolerance : float):
+    exact_state = replay(dump_to_load, strategy, aggregation, exact=True)
+    merged_state = replay(dump_to_load, strategy, aggregation, exact=False)
+    max_error = 0.0
+    failures = 0
+    for metric in REPORT_METRICS:
+        for expected, computed in zip(exact_state["model"][metric], merged_state["model"][metric]):
+            error = get_relative_error(np.float64(np.nan if expected is None else expected), np.float64(np.nan if computed is None else computed))
+            max_error = max(max_error, error)
+            failures+=int(error > tolerance)
+    return max_error, failures
+
+if __name__ == '__main__':
+
+    short_options = "hl:s:a:w:t:g:"
+    long_options = ["help","load=","strategy=","aggreg=","window=","tolerance=","stability-backend="]
+    dump_location = None
+    strategies = ["scroogevm", "nsigma"]
+    aggregation = 1
+    window = None
+    tolerance = 1e-12
+    stability_backend = "ar" # verdicts are the same for both replays, the fastest backend is enough
+
+    try:
+        arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
+    except getopt.error as err:
+        print (str(err)) # Output error, and return with an error code
+        sys.exit(2)
+    for current_argument, current_value in arguments:
+        if current_argument in ("-l", "--load"):
+            dump_location = current_value
+        elif current_argument in ("-s", "--strategy"):
+            strategies = current_value.split(',')
+        elif current_argument in ("-a", "--aggreg"):
+            aggregation = int(current_value)
+        elif current_argument in ("-w", "--window"):
+            window = int(current_value)
+        elif current_argument in ("-t", "--tolerance"):
+            tolerance = float(current_value)
+        elif current_argument in ("-g", "--stability-backend"):
+            stability_backend = current_value
+        else:
+            print("python3 momentsaccuracy.py [--help] [--load={dump}] [--strategy={strat}[,{strat}...]] [--aggreg={aggreg}] [--window={slices}] [--tolerance={relative}] [--stability-backend={lstm|ar}]")
+            sys.exit(0)
+
+    for strategy in strategies:
+        if strategy not in ["scroogevm", "nsigma"]: # only strategies relying on window moments
+            print("Strategy must be in ", ["scroogevm", "nsigma"])
+            sys.exit(2)
+    try:
+        SliceHostWrapper.enable_stability_backend(stability_backend)
+    except ValueError as err:
+        print(str(err))
+        sys.exit(2)
+    dump_to_load = open_dump(dump_location) if dump_location is not None else None
+    if window is None: # historical slices and the new one
+        window = (dump_to_load.get_config()["historical_occurences"] + 1) if dump_to_load is not None else 3
+
+    # Merged (count, mean, M2) against np.average and np.std over the concatenated window, then tiers against the full recomputation
+    failed = False
+    series = get_synthetic_series()
+    if dump_to_load is not None:
+        series.update(get_dump_series(dump_to_load))
+    max_error, failures = 0.0, 0
+    for name, slices in series.items():
+        serie_error, serie_failures = check_windows(slices, window, tolerance)
+        max_error, failures = max(max_error, serie_error), failures + serie_failures
+        if serie_failures:
+            print("Windows of", name, ":", serie_failures, "moments beyond tolerance, max relative error", serie_error)
+    print("Windows of", len(series), "series : max relative error", max_error, ", tolerance", tolerance, ("FAILED" if failures else "ok"))
+    failed = failed or (failures > 0)
+
+    if dump_to_load is not None:
+        for strategy in strategies:
+            max_error, failures = check_replays(dump_to_load, strategy, aggregation, tolerance)
+            print("Strategy", strategy, ": max relative error of", REPORT_METRICS, max_error, ", tolerance", tolerance, ("FAILED" if failures else "ok"))
+            failed = failed or (failures > 0)
+
+    if failed:
+        sys.exit(1)
@@ -1,9 +1,14 @@
-import os, time, sys, getopt, json
+import os, time, sys, getopt, json, multiprocessing, pickle, shutil, sqlite3
 from resultfilehandler import ResultFileHandler
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 from model.nodemodel import NodeModel
+from model.slicemodel import SliceModel
+from model.sliceobject import SliceObject
+from model.slicehostwrapper import SliceHostWrapper
 from model.dumpwriter import DumpWriter
+from model.replayengine import VectorizedReplayEngine
+from model.stability_assesser.stabilityassesserforecast import StabilityAssesserForecast
+from model.dumpreader import DumpReader, open_dump, load_dump, merge_dump_record, is_cluster_dump, get_node_dump_locations
 
 STATE_ENDPOINT = ""
 
@@ -13,40 +18,385 @@ SCHED_SCOPE_S = 0
 SCHED_SCOPE_SLICE_S = 0
 SCHED_SCOPE_INIT_FETCH_PREVIOUS = 0
 SCHED_SCOPE_HISTORICAL = 3
-DEBUG_DUMP_STATE = dict()
+REPLAY_SHARED = dict() # Parsed trace shared with replay workers
 
-def manage_node_debug(node_model : NodeModel, slice_number : int, cpu_percentile : int, mem_percentile : int, aggregation : int, debug : int = 0, epoch : int = -1, dump = False):
+def manage_node_debug(node_model : NodeModel, slice_number : int, debug : int = 0, epoch : int = -1, dump_writer : DumpWriter = None, dump_state : dict = None):
     if debug>0:
         print(node_model.__str__(slice_number))
-        node_model.dump_state_and_slice_to_dict(dump_dict=DEBUG_DUMP_STATE, slice_number=slice_number, epoch=epoch)
-        file = "dump-" + getattr(node_model, "node_name").replace("/", "") + "_c" + str(cpu_percentile) + "_m" + str(mem_percentile) + "_a" + str(aggregation) + ".json"
-        if(dump):
-            writer = DumpWriter(file, DEBUG_DUMP_STATE)
-            writer.run()
+        # Only the current occurence is dumped, previous ones were already written
+        record = node_model.dump_state_and_slice_to_dict(dump_dict=dict(), slice_number=slice_number, epoch=epoch)
+        if dump_writer is not None:
+            dump_writer.append(record)
+        if dump_state is not None:
+            merge_dump_record(dump_state, record)
     if debug>1:
         node_model.display_model()
 
-def main_loop_from_dump(dump_to_load: dict, debug : int = 0,  cpu_percentile : int = 90, mem_percentile : int = 90, aggregation : int = 90):
+def get_dump_file(node_name : str, cpu_percentile : int, mem_percentile : int, aggregation : int, extension : str = ".json"):
+    return "dump-" + node_name.replace("/", "") + "_c" + str(cpu_percentile) + "_m" + str(mem_percentile) + "_a" + str(aggregation) + extension
+
+def set_strategy_requirements(strategy : str, debug : int):
+    # Dumps hold every statistic, otherwise only what the strategy reads is fetched and computed
+    if debug>0:
+        SliceObject.disable_requirements()
+    else:
+        SliceObject.enable_requirements(*SliceModel.get_strategy_requirements(strategy))
+
+def save_checkpoint(file : str, state : dict):
+    # Written aside then renamed, a replay killed while checkpointing keeps the previous checkpoint
+    with open(file + ".tmp", 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(file + ".tmp", file)
+
+def load_checkpoint(file : str, parameters : dict):
+    with open(file, 'rb') as f:
+        state = pickle.load(f)
+    if state["parameters"] != parameters:
+        raise ValueError("Checkpoint " + file + " was taken with different parameters: " + str(state["parameters"]))
+    return state
+
+def main_loop_from_dump_vectorized(dump_to_load: DumpReader, debug : int, cpu_percentile : int, mem_percentile : int, aggregation : int, strategy : str, output : str,
+                        historical_occurences : int, save : bool = True, free_resources : list = None, from_occurence : int = 0):
+    engine = VectorizedReplayEngine(dump=dump_to_load, historical_occurences=historical_occurences, cpu_percentile=cpu_percentile, mem_percentile=mem_percentile,
+                                    strategy=strategy, aggregation=aggregation)
+    replay = engine.replay(from_occurence=from_occurence)
+    if free_resources is not None:
+        free_resources.extend(zip(replay["epoch"], replay["model"]["free_cpu"], replay["model"]["free_mem"]))
+    dump_state = replay if debug>0 else dict() # as the object engine, results are only dumped in debug mode
+    if save:
+        with open(output, 'w') as f:
+            f.write(json.dumps(dump_state))
+    return dump_state
+
+def main_loop_from_dump(dump_to_load: DumpReader, debug : int = 0,  cpu_percentile : int = 90, mem_percentile : int = 90, aggregation : int = 90, strategy : str = None, output : str = None,
+                        historical_occurences : int = None, save : bool = True, free_resources : list = None,
+                        checkpoint : int = 0, resume : bool = False, from_occurence : int = 0, engine : str = "object"):
+    if strategy is None:
+        strategy = SCHED_STRATEGY
+    if historical_occurences is None:
+        historical_occurences = dump_to_load.get_config()["historical_occurences"]
+    set_strategy_requirements(strategy, debug)
+    StabilityAssesserForecast.reset_models()
+    config = dump_to_load.get_config()
+    dump_state = None if save else dict() # kept in memory only when no file is written
     models = dict()
-    models[dump_to_load["config"]["node_name"]]= NodeModel(node_name=dump_to_load["config"]["node_name"], historical_occurences=dump_to_load["config"]["historical_occurences"],
-    cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, strategy=SCHED_STRATEGY, aggregation=aggregation,
-    model_scope=dump_to_load["config"]["node_scope"], slice_scope=dump_to_load["config"]["slice_scope"])
+    writers = dict()
+    models[config["node_name"]]= NodeModel(node_name=config["node_name"], historical_occurences=historical_occurences,
+    cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, strategy=strategy, aggregation=aggregation,
+    model_scope=config["node_scope"], slice_scope=config["slice_scope"])
+    file = output
+    if file is None:
+        file = get_dump_file(config["node_name"], cpu_percentile, mem_percentile, aggregation)
+    if engine == "vectorized": # whole trace at once, no checkpoint needed
+        return main_loop_from_dump_vectorized(dump_to_load, debug, cpu_percentile, mem_percentile, aggregation, strategy, file, historical_occurences, save, free_resources, from_occurence)
+    checkpoint_file = os.path.splitext(file)[0] + ".checkpoint"
+    parameters = {"node_name": config["node_name"], "strategy": strategy, "cpu_percentile": cpu_percentile, "mem_percentile": mem_percentile,
+                  "aggregation": aggregation, "historical_occurences": historical_occurences, "occurence_count": dump_to_load.get_occurence_count(),
+                  "sketch_accuracy": SliceObject.sketch_accuracy, "required_statistics": SliceObject.required_statistics}
 
-    for occurence in range(len(dump_to_load["epoch"])):
+    # Restore wrappers, ratios and tiers of the last checkpoint
+    first_occurence, sink_offsets, lstm_offset = 0, None, None
+    track_lstm = (strategy == "scroogevm") and (free_resources is None) # cluster nodes share dump-lstm.csv, it is left untouched
+    if resume and os.path.isfile(checkpoint_file):
+        state = load_checkpoint(checkpoint_file, parameters)
+        if state["occurence"] > from_occurence > 0:
+            raise ValueError("Checkpoint " + checkpoint_file + " was taken after occurence " + str(from_occurence))
+        models, dump_state, first_occurence = state["models"], state["dump_state"], state["occurence"]
+        StabilityAssesserForecast.instance_count = state["lstm_instance_count"]
+        if free_resources is not None:
+            free_resources.extend(state["free_resources"])
+        if state["from_occurence"] == from_occurence: # same output, records written after the checkpoint are dropped
+            sink_offsets, lstm_offset = state["sink_offsets"], state["lstm_offset"]
+        print("Resuming", checkpoint_file, "at occurence", first_occurence)
+    elif resume:
+        print("No checkpoint", checkpoint_file, "to resume, starting from first occurence")
+    if track_lstm and (lstm_offset is not None) and os.path.isfile('dump-lstm.csv'):
+        os.truncate('dump-lstm.csv', lstm_offset)
+
+    for node in models.keys():
+        if not save: break
+        sink = os.path.splitext(file)[0] + ".jsonl"
+        if sink_offsets is not None:
+            os.truncate(sink, sink_offsets[node])
+        writers[node] = DumpWriter(sink, append=(sink_offsets is not None))
+
+    for occurence in range(first_occurence, dump_to_load.get_occurence_count()):
+        # Occurences before from_occurence only warm the model up: nothing is displayed nor dumped
+        occurence_debug = debug if occurence >= from_occurence else 0
         # Retrieve nodes model
+        slice_numbers = {node_id : model.build_slice_from_dump(dump=dump_to_load, occurence=occurence) for node_id, model in models.items()}
+        SliceHostWrapper.flush_stability() # batched assessments of the occurence, if enabled
         for node_id, model in models.items():
-            slice_number = model.build_slice_from_dump(dump=dump_to_load, occurence=occurence)
-            manage_node_debug(node_model=model, slice_number=slice_number, debug=debug, epoch=dump_to_load["epoch"][occurence], cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, aggregation=aggregation)
+            slice_number = slice_numbers[node_id]
+            manage_node_debug(node_model=model, slice_number=slice_number, debug=occurence_debug, epoch=dump_to_load.get_epoch(occurence), dump_writer=writers.get(node_id, None), dump_state=dump_state)
+            if (free_resources is not None) and (occurence >= from_occurence):
+                free_resources.append((dump_to_load.get_epoch(occurence),) + model.get_free_cpu_mem(slice_number))
+
+        if save and (checkpoint > 0) and ((occurence+1) % checkpoint == 0):
+            save_checkpoint(checkpoint_file, {"parameters": parameters, "occurence": occurence+1, "from_occurence": from_occurence, "models": models, "dump_state": dump_state,
+                                              "free_resources": free_resources if free_resources is not None else list(),
+                                              "sink_offsets": {node: writer.tell() for node, writer in writers.items()},
+                                              "lstm_offset": os.path.getsize('dump-lstm.csv') if track_lstm and os.path.isfile('dump-lstm.csv') else None,
+                                              "lstm_instance_count": StabilityAssesserForecast.instance_count})
+
+    for node, writer in writers.items():
+        # Json Lines records are reassembled once in a json dump, as expected by scroogevm_analysis.ipynb
+        writer.close()
+        dump_state = load_dump(writer.file)
+        with open(os.path.splitext(writer.file)[0] + ".json", 'w') as f:
+            f.write(json.dumps(dump_state))
+        os.remove(writer.file)
+    if save and os.path.isfile(checkpoint_file):
+        os.remove(checkpoint_file) # replay completed
+    return dump_state
+
+def get_strategy_engine(strategy : str, engine : str):
+    # Strategies depending on their own past decisions (doa, scroogevm, maxpeak) are always replayed object by object
+    if (engine == "vectorized") and (strategy not in VectorizedReplayEngine.supported_strategies):
+        print("Strategy", strategy, "is not supported by the vectorized engine, replayed with the object engine")
+        return "object"
+    if (engine == "vectorized") and (SliceObject.sketch_accuracy is not None) and (strategy in ["percentile", "rclike"]):
+        print("Strategy", strategy, "is replayed with the object engine, the only one using quantile sketches")
+        return "object"
+    return engine
+
+def init_replay_worker(shared : dict):
+    global REPLAY_SHARED
+    REPLAY_SHARED = shared
+
+def create_replay_pool(jobs : int, shared : dict, maxtasksperchild : int = None):
+    # On fork, workers inherit the already parsed trace instead of receiving a pickled copy
+    global REPLAY_SHARED
+    REPLAY_SHARED = shared
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork').Pool(processes=jobs, maxtasksperchild=maxtasksperchild)
+    return multiprocessing.get_context('spawn').Pool(processes=jobs, initializer=init_replay_worker, initargs=(shared,), maxtasksperchild=maxtasksperchild)
+
+def replay_strategy_from_dump(strategy : str, debug : int, cpu_percentile : int, mem_percentile : int, aggregation : int,
+                              checkpoint : int = 0, resume : bool = False, from_occurence : int = 0, engine : str = "object"):
+    main_loop_from_dump(REPLAY_SHARED["dump"], debug, cpu_percentile, mem_percentile, aggregation, strategy=strategy, output="dump-" + strategy + ".json",
+                        checkpoint=checkpoint, resume=resume, from_occurence=from_occurence, engine=get_strategy_engine(strategy, engine))
+    return strategy
+
+def main_loop_from_dump_multi_strategy(dump_to_load: DumpReader, strategies : list, jobs : int = None, debug : int = 0,  cpu_percentile : int = 90, mem_percentile : int = 90, aggregation : int = 90,
+                                       checkpoint : int = 0, resume : bool = False, from_occurence : int = 0, engine : str = "object"):
+    # Trace is parsed once, each strategy is then replayed on its own NodeModel in a dedicated process
+    if jobs is None:
+        jobs = os.cpu_count()
+    jobs = max(1, min(jobs, len(strategies)))
+    with create_replay_pool(jobs, {"dump": dump_to_load}, maxtasksperchild=1) as pool: # a fresh process per strategy, as on separate runs
+        pending = [pool.apply_async(replay_strategy_from_dump, (strategy, debug, cpu_percentile, mem_percentile, aggregation, checkpoint, resume, from_occurence, engine)) for strategy in strategies]
+        for result in pending:
+            print("Strategy", result.get(), "replayed")
+
+def replay_node_from_dump(location : str, strategy : str, debug : int, cpu_percentile : int, mem_percentile : int, aggregation : int,
+                          checkpoint : int = 0, resume : bool = False, from_occurence : int = 0, engine : str = "object"):
+    dump_to_load = open_dump(location) # each worker maps its own node dump
+    node_name = dump_to_load.get_config()["node_name"]
+    free_resources = list()
+    main_loop_from_dump(dump_to_load, debug, cpu_percentile, mem_percentile, aggregation, strategy=strategy, free_resources=free_resources,
+                        output=get_dump_file(node_name, cpu_percentile, mem_percentile, aggregation, extension="-" + strategy + ".json"),
+                        checkpoint=checkpoint, resume=resume, from_occurence=from_occurence, engine=get_strategy_engine(strategy, engine))
+    return strategy, node_name, free_resources
+
+def merge_cluster_free_resources(node_free_resources : dict):
+    # Nodes are not sampled at the same epochs: at each epoch, a node contributes its last computed value (nothing before its first slice)
+    cluster = {"epoch": sorted(set([epoch for free_resources in node_free_resources.values() for epoch, free_cpu, free_mem in free_resources])),
+               "node": dict(), "model": {"free_cpu": list(), "free_mem": list()}}
+    for node_name, free_resources in node_free_resources.items():
+        free_resources = sorted(free_resources, key=lambda x: x[0])
+        node_free = {"free_cpu": list(), "free_mem": list()}
+        index, last_cpu, last_mem = 0, 0, 0
+        for epoch in cluster["epoch"]:
+            while (index < len(free_resources)) and (free_resources[index][0] <= epoch):
+                last_cpu, last_mem = free_resources[index][1], free_resources[index][2]
+                index+=1
+            node_free["free_cpu"].append(last_cpu)
+            node_free["free_mem"].append(last_mem)
+        cluster["node"][node_name] = node_free
+    for index in range(len(cluster["epoch"])):
+        cluster["model"]["free_cpu"].append(sum([node_free["free_cpu"][index] for node_free in cluster["node"].values()]))
+        cluster["model"]["free_mem"].append(sum([node_free["free_mem"][index] for node_free in cluster["node"].values()]))
+    return cluster
+
+def main_loop_from_dump_multi_node(locations : list, strategies : list, jobs : int = None, debug : int = 0,  cpu_percentile : int = 90, mem_percentile : int = 90, aggregation : int = 90,
+                                   checkpoint : int = 0, resume : bool = False, from_occurence : int = 0, engine : str = "object"):
+    # Each (node, strategy) is replayed in a dedicated process, results are then merged in a cluster dump per strategy
+    if jobs is None:
+        jobs = os.cpu_count()
+    tasks = [(location, strategy) for strategy in strategies for location in locations]
+    jobs = max(1, min(jobs, len(tasks)))
+    cluster_results = {strategy : dict() for strategy in strategies}
+    with create_replay_pool(jobs, dict(), maxtasksperchild=1) as pool:
+        pending = [pool.apply_async(replay_node_from_dump, (location, strategy, debug, cpu_percentile, mem_percentile, aggregation, checkpoint, resume, from_occurence, engine)) for location, strategy in tasks]
+        for result in pending:
+            strategy, node_name, free_resources = result.get()
+            print("Node", node_name, "replayed with strategy", strategy)
+            cluster_results[strategy][node_name] = free_resources
+    for strategy, node_free_resources in cluster_results.items():
+        cluster = merge_cluster_free_resources(node_free_resources)
+        cluster["config"] = {"strategy": strategy, "nodes": list(node_free_resources.keys()), "cpu_percentile": cpu_percentile, "mem_percentile": mem_percentile, "aggregation": aggregation}
+        with open("dump-cluster-" + strategy + ".json", 'w') as f:
+            f.write(json.dumps(cluster))
+    return cluster_results
+
+def replay_position_from_dump(position : int, debug : int, cpu_percentile : int, mem_percentile : int, aggregation : int, strategy : str,
+                              historical_occurences : int, sink : str, lstm_directory : str, from_occurence : int = 0):
+    # A slice position never reads the state of another one: its timeline is replayed alone, on a NodeModel of its own
+    dump_to_load = REPLAY_SHARED["dump"]
+    config = dump_to_load.get_config()
+    if lstm_directory is not None: # dump-lstm.csv is written in the current directory, each position gets its own
+        os.makedirs(lstm_directory, exist_ok=True)
+        os.chdir(lstm_directory)
+        init_lstm_debug(debug_level=debug, strategies=[strategy])
+    set_strategy_requirements(strategy, debug)
+    StabilityAssesserForecast.reset_models()
+    model = NodeModel(node_name=config["node_name"], historical_occurences=historical_occurences,
+    cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, strategy=strategy, aggregation=aggregation,
+    model_scope=config["node_scope"], slice_scope=config["slice_scope"])
+    writer = DumpWriter(sink) if sink is not None else None
+    free_resources, lstm_ids = list(), list()
+    for occurence in range(position, dump_to_load.get_occurence_count(), model.number_of_slice):
+        occurence_debug = debug if occurence >= from_occurence else 0
+        first_id = StabilityAssesserForecast.instance_count
+        slice_number = model.build_slice_from_dump(dump=dump_to_load, occurence=occurence)
+        SliceHostWrapper.flush_stability()
+        manage_node_debug(node_model=model, slice_number=slice_number, debug=occurence_debug, epoch=dump_to_load.get_epoch(occurence), dump_writer=writer)
+        free_resources.append((occurence, dump_to_load.get_epoch(occurence)) + model.get_free_cpu_mem(slice_number))
+        lstm_ids.append((occurence, first_id, StabilityAssesserForecast.instance_count))
+    if writer is not None:
+        writer.close()
+    return position, free_resources, lstm_ids
+
+def merge_position_lstm_debug(lstm_directories : dict, lstm_ids : list):
+    # Rows are appended in sequential replay order, assessers being renumbered as if they were created by a single process
+    rows = dict()
+    for position, lstm_directory in lstm_directories.items():
+        with open(os.path.join(lstm_directory, 'dump-lstm.csv'), 'r') as f:
+            next(f) # header
+            for line in f:
+                rows.setdefault((position, int(line.split('\t', 1)[0])), list()).append(line.split('\t', 1)[1])
+    with open('dump-lstm.csv', 'a') as fd:
+        for position, occurence, first_id, last_id in sorted(lstm_ids, key=lambda x: x[1]):
+            for local_id in range(first_id, last_id):
+                for row in rows.get((position, local_id), list()):
+                    fd.write(str(StabilityAssesserForecast.instance_count) + '\t' + row)
+                StabilityAssesserForecast.instance_count+=1
+
+def main_loop_from_dump_per_position(dump_to_load: DumpReader, debug : int = 0,  cpu_percentile : int = 90, mem_percentile : int = 90, aggregation : int = 90, strategy : str = None,
+                                     output : str = None, historical_occurences : int = None, jobs : int = None, free_resources : list = None, from_occurence : int = 0):
+    # Occurences are partitioned by slice position, each position being replayed in its own process. Outputs are then interleaved back in epoch order
+    if strategy is None:
+        strategy = SCHED_STRATEGY
+    config = dump_to_load.get_config()
+    if historical_occurences is None:
+        historical_occurences = config["historical_occurences"]
+    if jobs is None:
+        jobs = os.cpu_count()
+    number_of_slice = int(config["node_scope"]/config["slice_scope"])
+    file = output
+    if file is None:
+        file = get_dump_file(config["node_name"], cpu_percentile, mem_percentile, aggregation)
+    work_directory = os.path.abspath(os.path.splitext(file)[0] + ".positions")
+    os.makedirs(work_directory, exist_ok=True)
+    sinks = {position : os.path.join(work_directory, "position-" + str(position) + ".jsonl") for position in range(number_of_slice)}
+    lstm_directories = dict()
+    if (strategy == "scroogevm") and os.path.isfile('dump-lstm.csv'):
+        lstm_directories = {position : os.path.join(work_directory, "position-" + str(position)) for position in range(number_of_slice)}
+
+    results = dict()
+    with create_replay_pool(max(1, min(jobs, number_of_slice)), {"dump": dump_to_load}, maxtasksperchild=1) as pool:
+        pending = [pool.apply_async(replay_position_from_dump, (position, debug, cpu_percentile, mem_percentile, aggregation, strategy, historical_occurences,
+                    sinks[position], lstm_directories.get(position, None), from_occurence)) for position in range(number_of_slice)]
+        for result in pending:
+            position, position_free_resources, lstm_ids = result.get()
+            print("Slice position", position, "replayed")
+            results[position] = (position_free_resources, lstm_ids)
+
+    # Interleave records: occurence o is the (o // number_of_slice)th line of position o % number_of_slice
+    dump_state = dict()
+    position_files = {position : open(sink, 'r') for position, sink in sinks.items()}
+    for occurence in range(from_occurence if debug>0 else 0, dump_to_load.get_occurence_count() if debug>0 else 0):
+        merge_dump_record(dump_state, json.loads(position_files[occurence % number_of_slice].readline()))
+    for position_file in position_files.values():
+        position_file.close()
+    with open(file, 'w') as f:
+        f.write(json.dumps(dump_state))
+    if lstm_directories:
+        merge_position_lstm_debug(lstm_directories, [(position,) + ids for position, (position_free_resources, lstm_ids) in results.items() for ids in lstm_ids])
+    if free_resources is not None:
+        for occurence, epoch, free_cpu, free_mem in sorted([x for position_free_resources, lstm_ids in results.values() for x in position_free_resources]):
+            if occurence >= from_occurence:
+                free_resources.append((epoch, free_cpu, free_mem))
+    shutil.rmtree(work_directory)
+    return dump_state
+
+def compute_stability_verdict(occurence : int, window : list, aggregation : int, lstm_directory : str):
+    # Phase one: LSTM assessment of a host slice against the previous slices at its position, from raw data only
+    dump_to_load = REPLAY_SHARED["dump"]
+    if (lstm_directory is not None) and (os.path.basename(os.getcwd()) != str(os.getpid())):
+        worker_directory = os.path.join(lstm_directory, str(os.getpid())) # dump-lstm.csv is written in the current directory, one per worker
+        os.makedirs(worker_directory, exist_ok=True)
+        os.chdir(worker_directory)
+        init_lstm_debug(debug_level=1, strategies=["scroogevm"])
+    slice_list = [SliceObject(raw_data=dump_to_load.get_occurence(previous)["node"], aggregation=aggregation) for previous in window]
+    slice_to_be_added = SliceObject(raw_data=dump_to_load.get_occurence(occurence)["node"], aggregation=aggregation, compute=True)
+    cpu_stability, mem_stability = SliceHostWrapper.assess_stability(slice_list=slice_list, slice_to_be_added=slice_to_be_added)
+    rows = list()
+    if lstm_directory is not None:
+        with open('dump-lstm.csv', 'r+') as fd:
+            header = fd.readline()
+            rows = [line.split('\t', 1)[1] for line in fd]
+            fd.seek(len(header))
+            fd.truncate()
+    return occurence, cpu_stability, mem_stability, rows
 
-    for node, data in models.items():
-        file = "dump-" + node.replace("/", "") + "_c" + str(cpu_percentile) + "_m" + str(mem_percentile) + "_a" + str(aggregation) + ".json"
-        with open(file, 'w') as f:
-            f.write(json.dumps(DEBUG_DUMP_STATE))
+def get_stability_tasks(dump_to_load: DumpReader, historical_occurences : int = None):
+    # Windows only depend on which occurences hold node data: (occurence, previous occurences of its window) of every assessed slice
+    config = dump_to_load.get_config()
+    if historical_occurences is None:
+        historical_occurences = config["historical_occurences"]
+    number_of_slice = int(config["node_scope"]/config["slice_scope"])
+    history = [list() for position in range(number_of_slice)]
+    tasks = list()
+    for occurence in range(dump_to_load.get_occurence_count()):
+        if not dump_to_load.get_occurence(occurence)["node"]:
+            continue # no slice added on empty data
+        position = occurence % number_of_slice
+        if len(history[position]) >= (historical_occurences+1): # as SliceObjectWrapper.is_historical_full()
+            tasks.append((occurence, history[position][-(historical_occurences+1):]))
+        history[position].append(occurence)
+    return tasks
 
+def precompute_stability_verdicts(dump_to_load: DumpReader, aggregation : int, historical_occurences : int = None, jobs : int = None):
+    # Verdicts of every slice can be computed in parallel before the replay
+    config = dump_to_load.get_config()
+    if jobs is None:
+        jobs = os.cpu_count()
+    tasks = get_stability_tasks(dump_to_load, historical_occurences)
+    lstm_directory = os.path.abspath("dump-lstm.workers") if os.path.isfile('dump-lstm.csv') else None
+    verdicts = SliceHostWrapper.enable_stability_verdicts()
+    assesser_id = StabilityAssesserForecast.instance_count
+    with create_replay_pool(max(1, min(jobs, len(tasks))), {"dump": dump_to_load}) as pool:
+        pending = [pool.apply_async(compute_stability_verdict, (occurence, window, aggregation, lstm_directory)) for occurence, window in tasks]
+        for result in pending: # in occurence order, as assessed during a sequential replay
+            occurence, cpu_stability, mem_stability, rows = result.get()
+            verdicts[(config["node_name"], occurence)] = (cpu_stability, mem_stability)
+            if rows:
+                with open('dump-lstm.csv', 'a') as fd:
+                    for row in rows:
+                        fd.write(str(assesser_id) + '\t' + row)
+            assesser_id+=1
+    if lstm_directory is not None:
+        shutil.rmtree(lstm_directory)
+    print("Stability of", len(tasks), "slices precomputed")
+    return verdicts
 
 def main_loop_live(debug : int = 0,  cpu_percentile : int = 90, mem_percentile : int = 90, aggregation : int = 90):
     filehandler = ResultFileHandler()
     models = dict()
+    writers = dict()
+    set_strategy_requirements(SCHED_STRATEGY, debug)
     # Init
     for sched_node in SCHED_NODES:
         models[sched_node]= NodeModel(node_name=sched_node, model_scope=SCHED_SCOPE_S, slice_scope=SCHED_SCOPE_SLICE_S, 
@@ -54,6 +404,9 @@ def main_loop_live(debug : int = 0,  cpu_percentile : int = 90, mem_percentile :
         historical_occurences=SCHED_SCOPE_HISTORICAL)
         if SCHED_SCOPE_INIT_FETCH_PREVIOUS:
             models[sched_node].build_past_slices_from_epoch(SCHED_SCOPE_INIT_FETCH_PREVIOUS)
+        if debug>0: # Dump is appended slice after slice, see model.dumpreader.load_dump to reassemble it
+            writers[sched_node] = DumpWriter(get_dump_file(sched_node, cpu_percentile, mem_percentile, aggregation, extension=".jsonl"))
+    SliceHostWrapper.flush_stability()
     # Main loop
     sleep_duration = SCHED_SCOPE_SLICE_S
     while True:
@@ -62,34 +415,55 @@ def main_loop_live(debug : int = 0,  cpu_percentile : int = 90, mem_percentile :
         loop_begin = int(time.time())
         # Retrieve nodes model
         tiers = dict()
+        slice_numbers = {node_id : model.build_last_slice_from_epoch() for node_id, model in models.items()}
+        SliceHostWrapper.flush_stability() # assessments of all nodes at once, if enabled
         for node_id, model in models.items():
-            slice_number = model.build_last_slice_from_epoch()
+            slice_number = slice_numbers[node_id]
             tiers[node_id] = model.get_free_cpu_mem()
-            manage_node_debug(node_model=model, slice_number=slice_number, debug=debug, cpu_percentile=cpu_percentile, mem_percentile=mem_percentile, aggregation=aggregation, dump=True)
+            manage_node_debug(node_model=model, slice_number=slice_number, debug=debug, dump_writer=writers.get(node_id, None))
         # Write current state
         filehandler.writeResult(STATE_ENDPOINT, tiers)
         # Wait until next slice
         sleep_duration = SCHED_SCOPE_SLICE_S - (int(time.time()) - loop_begin)
 
-def init_lstm_debug(debug_level : int):
-    if SCHED_STRATEGY != "scroogevm" : return
+def init_lstm_debug(debug_level : int, strategies : list = None, resume : bool = False):
+    if strategies is None:
+        strategies = [SCHED_STRATEGY]
+    if "scroogevm" not in strategies : return
     dump_lstm_file_location = 'dump-lstm.csv'
+    if resume and os.path.isfile(dump_lstm_file_location):
+        return # truncated to its checkpointed size on resume
     if os.path.isfile(dump_lstm_file_location):
         os.remove(dump_lstm_file_location)
     header = 'iteration\tmetric\tconfig\ttrainscore\tprojectionscore\tgap\tthreshold\trealdata\tpredictold\tpredictnew\tinputold\tinputnew\n'
-    if debug>0:
+    if debug_level>0:
         with open(dump_lstm_file_location,'w') as fd:
             fd.write(header)
 
 if __name__ == '__main__':
 
-    short_options = "hd:l:s:c:m:a:"
-    long_options = ["help","debug=","load=","strategy=","cpu=","mem=","aggreg="]
-    loaded_dump = dict()
+    short_options = "hd:l:s:c:m:a:j:k:rf:e:ptq:n:w:bg:y:z:"
+    long_options = ["help","debug=","load=","strategy=","cpu=","mem=","aggreg=","jobs=","checkpoint=","resume","from-occurrence=","engine=","parallel-slices","precompute-stability","sketch=","retention=","warm-lstm=","batch-stability","stability-backend=","stability-cache=","stability-cache-size="]
+    loaded_dump = None
+    cluster_dumps = None
+    strategies = [SCHED_STRATEGY]
+    jobs = None
     debug = 0
     cpu_percentile = 90
     mem_percentile = 90
     aggregation = 1
+    checkpoint = 0
+    resume = False
+    from_occurence = 0
+    engine = "object"
+    parallel_slices = False
+    precompute_stability = False
+    retention = None
+    warm_lstm = False
+    batch_stability = False
+    stability_backend = None
+    stability_cache = None
+    stability_cache_size = 256 # MB
 
     try:
         arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
@@ -105,22 +479,94 @@ if __name__ == '__main__':
             mem_percentile = int(current_value)
         elif current_argument in ("-a", "--aggreg"):
             aggregation = int(current_value)
+        elif current_argument in ("-j", "--jobs"):
+            jobs = int(current_value)
+        elif current_argument in ("-k", "--checkpoint"):
+            checkpoint = int(current_value)
+        elif current_argument in ("-r", "--resume"):
+            resume = True
+        elif current_argument in ("-f", "--from-occurrence"):
+            from_occurence = int(current_value)
+        elif current_argument in ("-t", "--precompute-stability"):
+            precompute_stability = True
+        elif current_argument in ("-p", "--parallel-slices"):
+            parallel_slices = True
+        elif current_argument in ("-q", "--sketch"):
+            try:
+                SliceObject.enable_sketches(float(current_value)) # window percentiles from quantile sketches of this relative accuracy
+            except ValueError as err:
+                print(str(err))
+                sys.exit(2)
+        elif current_argument in ("-n", "--retention"):
+            retention = current_value
+        elif current_argument in ("-w", "--warm-lstm"):
+            try:
+                StabilityAssesserForecast.enable_warm_start(int(current_value)) # LSTM models kept between slices, trained on this number of samples at most
+            except ValueError as err:
+                print(str(err))
+                sys.exit(2)
+            warm_lstm = True
+        elif current_argument in ("-g", "--stability-backend"):
+            stability_backend = current_value
+        elif current_argument in ("-b", "--batch-stability"):
+            batch_stability = True
+        elif current_argument in ("-y", "--stability-cache"):
+            stability_cache = current_value
+        elif current_argument in ("-z", "--stability-cache-size"):
+            stability_cache_size = int(current_value)
+        elif current_argument in ("-e", "--engine"):
+            engine = current_value
+            if engine not in ["object", "vectorized"]:
+                print("Engine must be in ", ["object", "vectorized"])
+                sys.exit(2)
         elif current_argument in ("-u", "--url"):
             SCHED_NODES = json.loads(current_value)
         elif current_argument in ("-s", "--strategy"):
-            strategies=['percentile', 'doa', 'scroogevm', 'nsigma', 'rclike', 'borg', 'maxpeak']
-            if current_value not in strategies:
-                print("Strategy must be in ", strategies)
-                sys.exit(2)
-            SCHED_STRATEGY = current_value
+            available_strategies=['percentile', 'doa', 'scroogevm', 'nsigma', 'rclike', 'borg', 'maxpeak']
+            strategies = current_value.split(',') # multiple strategies can be replayed at once in offline mode
+            for strategy in strategies:
+                if strategy not in available_strategies:
+                    print("Strategy must be in ", available_strategies)
+                    sys.exit(2)
+            SCHED_STRATEGY = strategies[0]
         elif current_argument in ("-l", "--load"):
-            with open(current_value, 'r') as f:
-                loaded_dump = json.load(f)
+            if is_cluster_dump(current_value): # directory or manifest of node dumps
+                cluster_dumps = get_node_dump_locations(current_value)
+            else:
+                loaded_dump = open_dump(current_value) # json dump or columnar directory, occurences are decoded one at a time
         else:
-            print("python3 scroogevm.py [--help] [--debug={level}] [--load={dump}] [--strategy={strat}] [--url={url}] [--cpu={cpu}] [--mem={mem}] [--aggreg={url}]")
+            print("python3 scroogevm.py [--help] [--debug={level}] [--load={dump|cluster}] [--strategy={strat}[,{strat}...]] [--jobs={processes}] [--checkpoint={occurences}] [--resume] [--from-occurrence={occurence}] [--engine={object|vectorized}] [--parallel-slices] [--precompute-stability] [--sketch={accuracy}] [--retention={full|summary|spill}] [--warm-lstm={samples}] [--batch-stability] [--stability-backend={lstm|ar}] [--stability-cache={file} [--stability-cache-size={MB}]] [--url={url}] [--cpu={cpu}] [--mem={mem}] [--aggreg={url}]")
             sys.exit(0)
     
-    if not loaded_dump:
+    if (len(strategies)>1) and (loaded_dump is None) and (cluster_dumps is None):
+        print("Multiple strategies can only be replayed in offline mode")
+        sys.exit(2)
+
+    if ((checkpoint>0) or resume or (from_occurence>0)) and (loaded_dump is None) and (cluster_dumps is None):
+        print("Checkpoints can only be used in offline mode")
+        sys.exit(2)
+
+    if parallel_slices and ((loaded_dump is None) or (len(strategies)>1) or (checkpoint>0) or resume or (engine != "object")):
+        print("Slice positions can only be replayed in parallel for a single node dump and strategy, with the object engine and without checkpoint")
+        sys.exit(2)
+
+    if precompute_stability and ((loaded_dump is None) or (strategies != ["scroogevm"]) or resume):
+        print("Stability can only be precomputed for a single node dump replayed with scroogevm strategy, without resuming")
+        sys.exit(2)
+
+    if warm_lstm and (precompute_stability or (checkpoint>0) or resume):
+        print("Warm started LSTM models depend on previous slices and are not kept in checkpoints, they cannot be used with precomputed stability nor checkpoints")
+        sys.exit(2)
+
+    if warm_lstm and batch_stability:
+        print("Batched stability assessments train new models on every slice boundary, they cannot be combined with warm started LSTM models")
+        sys.exit(2)
+
+    if cluster_dumps is not None and not cluster_dumps:
+        print("No node dump found in cluster")
+        sys.exit(2)
+
+    if (loaded_dump is None) and (cluster_dumps is None):
         load_dotenv()
         STATE_ENDPOINT = os.getenv('STATE_ENDPOINT')
         if not SCHED_NODES:
@@ -129,14 +575,63 @@ if __name__ == '__main__':
         SCHED_SCOPE_SLICE_S = int(os.getenv('SCHED_SCOPE_SLICE_S'))
         SCHED_SCOPE_INIT_FETCH_PREVIOUS = int(os.getenv('SCHED_SCOPE_INIT_FETCH_PREVIOUS'))
         SCHED_SCOPE_HISTORICAL= int(os.getenv('SCHED_SCOPE_HISTORICAL'))
+        if retention is None:
+            retention = os.getenv('SCHED_RETENTION', "full")
+        if stability_backend is None:
+            stability_backend = os.getenv('SCHED_STABILITY_BACKEND', "lstm")
+
+    if stability_backend is not None:
+        if (stability_backend != "lstm") and (warm_lstm or batch_stability):
+            print("Warm started and batched stability assessments are only available with lstm backend")
+            sys.exit(2)
+        try:
+            SliceHostWrapper.enable_stability_backend(stability_backend)
+        except ValueError as err:
+            print(str(err))
+            sys.exit(2)
+
+    if stability_cache is not None:
+        if warm_lstm or batch_stability or (SliceHostWrapper.stability_backend != "lstm"):
+            print("Stability verdicts are only cached for LSTM models trained from scratch on each slice, without warm start nor batching")
+            sys.exit(2)
+        try:
+            StabilityAssesserForecast.enable_cache(stability_cache, max_size=stability_cache_size*1024*1024) # verdicts of seen windows are read back, TensorFlow is then never loaded
+        except (ValueError, sqlite3.Error) as err:
+            print(str(err))
+            sys.exit(2)
+
+    if batch_stability:
+        from model.stability_assesser.stabilityservice import StabilityService # TensorFlow, only loaded when needed
+        SliceHostWrapper.enable_stability_service(StabilityService()) # LSTM assessments of a slice boundary trained at once
+
+    if retention is not None:
+        if (retention == "summary") and (debug>0):
+            print("Summary retention drops raw samples, which are needed by dumps in debug mode")
+            sys.exit(2)
+        if (retention == "spill") and ((checkpoint>0) or resume):
+            print("Spilled raw samples are not kept in checkpoints, spill retention cannot be used with checkpoints")
+            sys.exit(2)
+        try:
+            SliceObject.enable_retention(retention, directory=os.getenv('SCHED_RETENTION_DIRECTORY'))
+        except ValueError as err:
+            print(str(err))
+            sys.exit(2)
 
-    init_lstm_debug(debug_level=debug)
+    init_lstm_debug(debug_level=debug, strategies=strategies, resume=resume)
 
     try:
-        if not loaded_dump: 
+        if precompute_stability:
+            precompute_stability_verdicts(loaded_dump, aggregation, jobs=jobs) # phase one, LSTM assessments in parallel
+        if cluster_dumps is not None:
+            main_loop_from_dump_multi_node(cluster_dumps, strategies, jobs, debug, cpu_percentile, mem_percentile, aggregation, checkpoint, resume, from_occurence, engine) # offline mode, one process per node
+        elif loaded_dump is None:
             main_loop_live(debug, cpu_percentile, mem_percentile, aggregation) # live mode
+        elif len(strategies)>1:
+            main_loop_from_dump_multi_strategy(loaded_dump, strategies, jobs, debug, cpu_percentile, mem_percentile, aggregation, checkpoint, resume, from_occurence, engine) # offline mode, one process per strategy
+        elif parallel_slices:
+            main_loop_from_dump_per_position(loaded_dump, debug, cpu_percentile, mem_percentile, aggregation, jobs=jobs, from_occurence=from_occurence) # offline mode, one process per slice position
         else:
-            main_loop_from_dump(loaded_dump, debug, cpu_percentile, mem_percentile, aggregation) # offline mode
+            main_loop_from_dump(loaded_dump, debug, cpu_percentile, mem_percentile, aggregation, checkpoint=checkpoint, resume=resume, from_occurence=from_occurence, engine=get_strategy_engine(SCHED_STRATEGY, engine)) # offline mode
     except KeyboardInterrupt:
         print("Program interrupted")
         sys.exit(0)
@@ -0,0 +1,175 @@
+import os, sys, getopt, json, itertools, contextlib, sqlite3
+import scroogevm
+from scroogevm import main_loop_from_dump, create_replay_pool, init_lstm_debug
+from model.sliceobject import SliceObject
+from model.dumpreader import DumpReader
+from model.stability_assesser.stabilityassesserforecast import StabilityAssesserForecast
+
+SWEEP_PARAMETERS = ["strategy", "cpu", "mem", "aggreg", "historical"]
+SWEEP_SUMMARY = ["mean_free_cpu", "mean_free_mem", "mean_cpu_oversubscription", "cpu_misprediction", "cpu_violation"]
+
+def build_combinations(grid : dict, default : dict):
+    for parameter in grid.keys():
+        if parameter not in SWEEP_PARAMETERS:
+            raise ValueError("Unknown sweep parameter " + parameter + ", must be in " + str(SWEEP_PARAMETERS))
+    values = [grid.get(parameter, [default[parameter]]) for parameter in SWEEP_PARAMETERS]
+    return [dict(zip(SWEEP_PARAMETERS, combination)) for combination in itertools.product(*values)]
+
+def get_raw_data_list(dump_to_load : dict):
+    raw_data_list = [raw_data for raw_data in dump_to_load["node"]["raw_data"] if raw_data]
+    for vm_dump_data in dump_to_load["vm"].values():
+        raw_data_list.extend([raw_data for raw_data in vm_dump_data.get("raw_data", list()) if raw_data])
+    return raw_data_list
+
+def compute_statistics(task : tuple):
+    # Slice statistics only depend on raw data and aggregation, not on strategy, percentiles or historical
+    # Each worker takes a share of the raw data and computes all aggregations, finest first, from the same pyramids
+    first, last, aggregations = task
+    raw_data_list = get_raw_data_list(scroogevm.REPLAY_SHARED["dump"])[first:last]
+    SliceObject.enable_pyramid_cache()
+    statistics_per_aggregation = list()
+    for aggregation in aggregations:
+        slice_list = [SliceObject(raw_data=raw_data, aggregation=aggregation) for raw_data in raw_data_list]
+        SliceObject.compute_attributes_batch(slice_list, raw_data_list)
+        statistics_per_aggregation.append([slice.get_statistics() for slice in slice_list])
+    SliceObject.pyramid_cache = None
+    return statistics_per_aggregation
+
+def warm_statistics_cache(dump_to_load : dict, aggregations : list, jobs : int):
+    raw_data_list = get_raw_data_list(dump_to_load)
+    share = max(1, -(-len(raw_data_list)//jobs))
+    tasks = [(first, min(first + share, len(raw_data_list)), aggregations) for first in range(0, len(raw_data_list), share)]
+    cache = SliceObject.enable_statistics_cache()
+    if not tasks:
+        return cache
+    with create_replay_pool(max(1, min(jobs, len(tasks))), {"dump": dump_to_load}) as pool:
+        statistics_per_task = pool.map(compute_statistics, tasks)
+    for (first, last, aggregations), statistics_per_aggregation in zip(tasks, statistics_per_task):
+        for aggregation, statistics_list in zip(aggregations, statistics_per_aggregation):
+            for raw_data, statistics in zip(raw_data_list[first:last], statistics_list):
+                cache[(id(raw_data), aggregation)] = (raw_data, statistics)
+    return cache
+
+def get_node_percentile(percentile_dict : dict, percentile : int):
+    if percentile in percentile_dict:
+        return percentile_dict[percentile]
+    return percentile_dict[str(percentile)]
+
+def summarize_replay(dump_state : dict):
+    # Same evaluation as scroogevm_analysis.ipynb : misprediction of available cores against the 99th percentile of the next slice
+    summary = {key : None for key in SWEEP_SUMMARY}
+    if not dump_state.get("epoch", False):
+        return summary
+    oversubscription_list = list()
+    misprediction, violation = 0, 0
+    prev_available, prev_percentile, prev_booked = 0, 0, 0
+    for index in range(len(dump_state["epoch"])):
+        available = dump_state["model"]["free_cpu"][index]
+        config = dump_state["node"]["cpu_config"][index]
+        booked = dump_state["node"]["booked_cpu"][index]
+        percentile = get_node_percentile(dump_state["node"]["cpu_percentile"][index], 99)
+        delta_booked = booked - prev_booked
+        correction = delta_booked if delta_booked>=0 else percentile - prev_percentile
+        if index > 0:
+            current_misprediction = (config - percentile) - (prev_available - correction)
+            misprediction += abs(current_misprediction)
+            violation += abs(current_misprediction) if current_misprediction < 0 else 0
+        oversubscription_list.append((booked + available)/config)
+        prev_available, prev_percentile, prev_booked = available, percentile, booked
+    summary["mean_free_cpu"] = sum(dump_state["model"]["free_cpu"])/len(dump_state["epoch"])
+    summary["mean_free_mem"] = sum(dump_state["model"]["free_mem"])/len(dump_state["epoch"])
+    summary["mean_cpu_oversubscription"] = sum(oversubscription_list)/len(oversubscription_list)
+    summary["cpu_misprediction"] = misprediction
+    summary["cpu_violation"] = violation
+    return summary
+
+def get_combination_as_str(combination : dict):
+    return combination["strategy"] + "_c" + str(combination["cpu"]) + "_m" + str(combination["mem"]) + "_a" + str(combination["aggreg"]) + "_h" + str(combination["historical"])
+
+def replay_combination(combination : dict, debug : int = 0):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        dump_state = main_loop_from_dump(DumpReader(scroogevm.REPLAY_SHARED["dump"]), debug=1, cpu_percentile=combination["cpu"], mem_percentile=combination["mem"],
+                        aggregation=combination["aggreg"], strategy=combination["strategy"], historical_occurences=combination["historical"],
+                        output="dump-sweep-" + get_combination_as_str(combination) + ".json", save=(debug>0))
+    return combination, summarize_replay(dump_state)
+
+def sweep_from_dump(dump_to_load : dict, grid : dict, default : dict, output : str, jobs : int = None, debug : int = 0):
+    combinations = build_combinations(grid, default)
+    if jobs is None:
+        jobs = os.cpu_count()
+    aggregations = sorted(set([combination["aggreg"] for combination in combinations]))
+    warm_statistics_cache(dump_to_load, aggregations, jobs)
+    print("Slice statistics computed for aggregation", aggregations, ", sweeping", len(combinations), "combinations")
+    separator = '\t'
+    with open(output, 'w') as fd:
+        fd.write(separator.join(SWEEP_PARAMETERS + SWEEP_SUMMARY) + '\n')
+        with create_replay_pool(max(1, min(jobs, len(combinations))), {"dump": dump_to_load}, maxtasksperchild=1) as pool:
+            pending = [pool.apply_async(replay_combination, (combination, debug)) for combination in combinations]
+            for result in pending:
+                combination, summary = result.get()
+                print("Combination", get_combination_as_str(combination), "replayed")
+                fd.write(separator.join([str(combination[key]) for key in SWEEP_PARAMETERS] + [str(summary[key]) for key in SWEEP_SUMMARY]) + '\n')
+                fd.flush()
+
+if __name__ == '__main__':
+
+    short_options = "hd:l:g:o:j:y:z:"
+    long_options = ["help","debug=","load=","grid=","output=","jobs=","stability-cache=","stability-cache-size="]
+    loaded_dump = dict()
+    grid = dict()
+    output = None
+    jobs = None
+    debug = 0
+    stability_cache = None
+    stability_cache_size = 256 # MB
+
+    try:
+        arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
+    except getopt.error as err:
+        print (str(err)) # Output error, and return with an error code
+        sys.exit(2)
+    for current_argument, current_value in arguments:
+        if current_argument in ("-d", "--debug"):
+            debug = int(current_value)
+        elif current_argument in ("-g", "--grid"):
+            if os.path.isfile(current_value):
+                with open(current_value, 'r') as f:
+                    grid = json.load(f)
+            else:
+                grid = json.loads(current_value)
+        elif current_argument in ("-o", "--output"):
+            output = current_value
+        elif current_argument in ("-j", "--jobs"):
+            jobs = int(current_value)
+        elif current_argument in ("-y", "--stability-cache"):
+            stability_cache = current_value
+        elif current_argument in ("-z", "--stability-cache-size"):
+            stability_cache_size = int(current_value)
+        elif current_argument in ("-l", "--load"):
+            with open(current_value, 'r') as f:
+                loaded_dump = json.load(f)
+        else:
+            print("python3 scroogevmsweep.py [--help] [--debug={level}] --load={dump} --grid={grid.json} [--output={table.csv}] [--jobs={processes}] [--stability-cache={file} [--stability-cache-size={MB}]]")
+            sys.exit(0)
+
+    if not loaded_dump: # whole trace is kept in memory so that slice statistics can be shared between combinations
+        print("A dump must be loaded to perform a sweep")
+        sys.exit(2)
+
+    default = {"strategy": scroogevm.SCHED_STRATEGY, "cpu": 90, "mem": 90, "aggreg": 1, "historical": loaded_dump["config"]["historical_occurences"]}
+    if output is None:
+        output = "sweep-" + loaded_dump["config"]["node_name"].replace("/", "") + ".csv"
+
+    init_lstm_debug(debug_level=0, strategies=grid.get("strategy", [default["strategy"]]))
+    if stability_cache is not None: # combinations sharing aggregation and historical occurences assess the same windows
+        try:
+            StabilityAssesserForecast.enable_cache(stability_cache, max_size=stability_cache_size*1024*1024)
+        except (ValueError, sqlite3.Error) as err:
+            print(str(err))
+            sys.exit(2)
+
+    try:
+        sweep_from_dump(loaded_dump, grid, default, output, jobs, debug)
+    except KeyboardInterrupt:
+        print("Program interrupted")
+        sys.exit(0)
@@ -0,0 +1,95 @@
+import os, sys, getopt, time, contextlib
+import numpy as np
+from scroogevm import main_loop_from_dump
+from model.sliceobject import SliceObject
+from model.dumpreader import open_dump
+
+# Tiers as computed by the strategy (node section) and resulting free resources (model section)
+REPORT_METRICS = [("node", "cpu_tier0"), ("node", "mem_tier0"), ("model", "free_cpu"), ("model", "free_mem")]
+
+def replay(dump_to_load, strategy : str, cpu_percentile : int, mem_percentile : int, aggregation : int, accuracy : float = None):
+    SliceObject.sketch_accuracy = None # exact percentiles
+    if accuracy is not None:
+        SliceObject.enable_sketches(accuracy)
+    begin = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        dump_state = main_loop_from_dump(dump_to_load, debug=1, cpu_percentile=cpu_percentile, mem_percentile=mem_percentile,
+                                         aggregation=aggregation, strategy=strategy, save=False)
+    return dump_state, time.perf_counter() - begin
+
+def get_relative_errors(exact : list, approximated : list):
+    exact, approximated = np.asarray(exact, dtype=np.float64), np.asarray(approximated, dtype=np.float64)
+    scale = np.maximum(np.abs(exact), np.abs(approximated))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        errors = np.where(scale > 0, np.abs(approximated - exact)/scale, 0.0)
+    return errors[~np.isnan(errors)]
+
+def compare_replays(exact_state : dict, sketch_state : dict):
+    report = dict()
+    for section, metric in REPORT_METRICS:
+        errors = get_relative_errors(exact_state[section][metric], sketch_state[section][metric])
+        report["max_error_" + metric] = errors.max() if errors.size else 0.0
+        report["mean_error_" + metric] = errors.mean() if errors.size else 0.0
+    return report
+
+if __name__ == '__main__':
+
+    short_options = "hl:s:c:m:a:x:o:"
+    long_options = ["help","load=","strategy=","cpu=","mem=","aggreg=","accuracy=","output="]
+    dump_location = None
+    strategies = ["percentile", "rclike"]
+    accuracies = [0.05, 0.01, 0.005]
+    cpu_percentile = 90
+    mem_percentile = 90
+    aggregation = 1
+    output = None
+
+    try:
+        arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
+    except getopt.error as err:
+        print (str(err)) # Output error, and return with an error code
+        sys.exit(2)
+    for current_argument, current_value in arguments:
+        if current_argument in ("-l", "--load"):
+            dump_location = current_value
+        elif current_argument in ("-s", "--strategy"):
+            strategies = current_value.split(',')
+        elif current_argument in ("-c", "--cpu"):
+            cpu_percentile = int(current_value)
+        elif current_argument in ("-m", "--mem"):
+            mem_percentile = int(current_value)
+        elif current_argument in ("-a", "--aggreg"):
+            aggregation = int(current_value)
+        elif current_argument in ("-x", "--accuracy"):
+            accuracies = [float(x) for x in current_value.split(',')]
+        elif current_argument in ("-o", "--output"):
+            output = current_value
+        else:
+            print("python3 sketchaccuracy.py [--help] --load={dump} [--strategy={strat}[,{strat}...]] [--accuracy={accuracy}[,{accuracy}...]] [--cpu={cpu}] [--mem={mem}] [--aggreg={aggreg}] [--output={table.csv}]")
+            sys.exit(0)
+
+    if dump_location is None:
+        print("A dump must be loaded to assess sketch accuracy")
+        sys.exit(2)
+    for strategy in strategies:
+        if strategy not in ["percentile", "rclike"]: # only strategies relying on window percentiles
+            print("Strategy must be in ", ["percentile", "rclike"])
+            sys.exit(2)
+    dump_to_load = open_dump(dump_location)
+    if output is None:
+        output = "sketch-" + dump_to_load.get_config()["node_name"].replace("/", "") + ".csv"
+
+    # Each strategy is replayed once exactly, then once per sketch accuracy
+    separator = '\t'
+    header = ["strategy", "accuracy", "exact_time", "sketch_time"] + [prefix + metric for section, metric in REPORT_METRICS for prefix in ["max_error_", "mean_error_"]]
+    with open(output, 'w') as fd:
+        fd.write(separator.join(header) + '\n')
+        for strategy in strategies:
+            exact_state, exact_time = replay(dump_to_load, strategy, cpu_percentile, mem_percentile, aggregation)
+            for accuracy in accuracies:
+                sketch_state, sketch_time = replay(dump_to_load, strategy, cpu_percentile, mem_percentile, aggregation, accuracy=accuracy)
+                report = compare_replays(exact_state, sketch_state)
+                report.update({"strategy": strategy, "accuracy": accuracy, "exact_time": round(exact_time, 3), "sketch_time": round(sketch_time, 3)})
+                print("Strategy", strategy, "accuracy", accuracy, ": max cpu_tier0 error", report["max_error_cpu_tier0"], ", max mem_tier0 error", report["max_error_mem_tier0"])
+                fd.write(separator.join([str(report[key]) for key in header]) + '\n')
+                fd.flush()
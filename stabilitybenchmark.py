@@ -0,0 +1,100 @@
+import os, sys, getopt, time, contextlib
+import numpy as np
+from scroogevm import get_stability_tasks
+from model.sliceobject import SliceObject
+from model.slicehostwrapper import SliceHostWrapper
+from model.dumpreader import open_dump
+
+def get_windows(dump_to_load, aggregation : int, historical_occurences : int = None, limit : int = None):
+    # Windows assessed by the scroogevm strategy, slices being built once and shared by every backend
+    windows = list()
+    for occurence, window in get_stability_tasks(dump_to_load, historical_occurences)[:limit]:
+        slice_list = [SliceObject(raw_data=dump_to_load.get_occurence(previous)["node"], aggregation=aggregation) for previous in window]
+        slice_to_be_added = SliceObject(raw_data=dump_to_load.get_occurence(occurence)["node"], aggregation=aggregation, compute=True)
+        windows.append((occurence, slice_list, slice_to_be_added))
+    return windows
+
+def assess(backend : str, windows : list):
+    # Backend imports are timed apart from assessments, the LSTM one only loading TensorFlow and sklearn once a model is trained
+    SliceHostWrapper.enable_stability_backend(backend)
+    begin = time.perf_counter()
+    SliceHostWrapper.get_stability_assesser()
+    if backend == "lstm":
+        import tensorflow.keras.layers, tensorflow.keras.models, sklearn.metrics
+    import_time = time.perf_counter() - begin
+    verdicts, durations = list(), list()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for occurence, slice_list, slice_to_be_added in windows:
+            begin = time.perf_counter()
+            verdicts.append(SliceHostWrapper.assess_stability(slice_list=slice_list, slice_to_be_added=slice_to_be_added))
+            durations.append(time.perf_counter() - begin)
+    return verdicts, durations, import_time
+
+if __name__ == '__main__':
+
+    short_options = "hl:g:a:k:n:o:"
+    long_options = ["help","load=","stability-backend=","aggreg=","historical=","limit=","output="]
+    dump_location = None
+    backends = ["lstm", "ar"]
+    aggregation = 90
+    historical_occurences = None
+    limit = None
+    output = None
+
+    try:
+        arguments, values = getopt.getopt(sys.argv[1:], short_options, long_options)
+    except getopt.error as err:
+        print (str(err)) # Output error, and return with an error code
+        sys.exit(2)
+    for current_argument, current_value in arguments:
+        if current_argument in ("-l", "--load"):
+            dump_location = current_value
+        elif current_argument in ("-g", "--stability-backend"):
+            backends = current_value.split(',')
+        elif current_argument in ("-a", "--aggreg"):
+            aggregation = int(current_value)
+        elif current_argument in ("-k", "--historical"):
+            historical_occurences = int(current_value)
+        elif current_argument in ("-n", "--limit"):
+            limit = int(current_value)
+        elif current_argument in ("-o", "--output"):
+            output = current_value
+        else:
+            print("python3 stabilitybenchmark.py [--help] --load={dump} [--stability-backend={backend}[,{backend}...]] [--aggreg={aggreg}] [--historical={occurences}] [--limit={slices}] [--output={table.csv}]")
+            sys.exit(0)
+
+    if dump_location is None:
+        print("A dump must be loaded to benchmark stability backends")
+        sys.exit(2)
+    for backend in backends:
+        if backend not in SliceHostWrapper.stability_backends:
+            print("Stability backend must be in ", SliceHostWrapper.stability_backends)
+            sys.exit(2)
+    dump_to_load = open_dump(dump_location)
+    windows = get_windows(dump_to_load, aggregation, historical_occurences, limit)
+    if not windows:
+        print("No slice with a full historical window in this dump")
+        sys.exit(2)
+
+    # Each window is assessed by every backend, verdicts being compared to the ones of the first backend
+    results = dict()
+    for backend in backends:
+        verdicts, durations, import_time = assess(backend, windows)
+        results[backend] = (verdicts, durations)
+        reference = results[backends[0]][0]
+        cpu_agreement = np.mean([verdict[0] == expected[0] for verdict, expected in zip(verdicts, reference)])
+        mem_agreement = np.mean([verdict[1] == expected[1] for verdict, expected in zip(verdicts, reference)])
+        print("Backend", backend, ":", len(windows), "slices, import", round(import_time, 3), "s, mean assessment", round(np.mean(durations), 4),
+              "s, agreement with", backends[0], "cpu", round(cpu_agreement, 3), "mem", round(mem_agreement, 3))
+
+    if output is not None:
+        separator = '\t'
+        header = ["occurence"] + [backend + suffix for backend in backends for suffix in ["_cpu_stability", "_mem_stability", "_time"]]
+        with open(output, 'w') as fd:
+            fd.write(separator.join(header) + '\n')
+            for index, (occurence, slice_list, slice_to_be_added) in enumerate(windows):
+                row = [occurence]
+                for backend in backends:
+                    verdicts, durations = results[backend]
+                    row.extend([verdicts[index][0], verdicts[index][1], round(durations[index], 4)])
+                fd.write(separator.join([str(value) for value in row]) + '\n')